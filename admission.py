@@ -0,0 +1,474 @@
+"""
+Admission control
+Bounded (optionally adaptive) concurrency with a bounded, time-limited,
+weighted-fair wait queue
+"""
+
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, reason, retry_after=1):
+        super().__init__(f"Admission rejected: {reason}")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+DEFAULT_TENANT = "default"
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class _Waiter:
+    def __init__(self, tenant=DEFAULT_TENANT, priority=0):
+        self.event = threading.Event()
+        self.granted = False
+        self.shed_reason = None
+        self.removed = False
+        self.tenant = tenant
+        self.priority = priority
+        self.start_tag = 0.0
+        self.enqueued_at = time.monotonic()
+
+
+class FairQueue:
+    """Strict priority between classes, start-time fair queuing between tenants within a class.
+
+    Each tenant's requests get virtual start/finish tags spaced 1/weight
+    apart, so a tenant with weight 4 is served four times as often as one
+    with weight 1 while both are backlogged, and an idle tenant does not
+    bank credit.
+    """
+
+    def __init__(self, weights=None, default_weight=1.0):
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self._heaps = {}
+        self._last_finish = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._size = 0
+        self.depth_by_tenant = {}
+
+    def __len__(self):
+        return self._size
+
+    def weight(self, tenant):
+        return self.weights.get(tenant, self.default_weight)
+
+    def push(self, waiter):
+        start = max(self._virtual_time, self._last_finish.get(waiter.tenant, 0.0))
+        self._last_finish[waiter.tenant] = start + 1.0 / self.weight(waiter.tenant)
+        waiter.start_tag = start
+        heapq.heappush(self._heaps.setdefault(waiter.priority, []), (self._last_finish[waiter.tenant], next(self._seq), waiter))
+        self._count(waiter, 1)
+
+    def pop(self):
+        for priority in sorted(self._heaps):
+            heap = self._heaps[priority]
+            while heap:
+                _, _, waiter = heapq.heappop(heap)
+                if waiter.removed:
+                    continue
+                self._virtual_time = max(self._virtual_time, waiter.start_tag)
+                self._count(waiter, -1)
+                return waiter
+        return None
+
+    def remove(self, waiter):
+        """Lazy removal (e.g. queue timeout); the heap entry is skipped on pop"""
+        waiter.removed = True
+        self._count(waiter, -1)
+
+    def _count(self, waiter, delta):
+        self._size += delta
+        depth = self.depth_by_tenant.get(waiter.tenant, 0) + delta
+        if depth:
+            self.depth_by_tenant[waiter.tenant] = depth
+        else:
+            self.depth_by_tenant.pop(waiter.tenant, None)
+
+    def oldest_enqueued_at(self):
+        times = [w.enqueued_at for heap in self._heaps.values() for _, _, w in heap if not w.removed]
+        return min(times) if times else None
+
+
+class CoDel:
+    """Controlled Delay: decides at dequeue time whether to shed a queued request.
+
+    Once queue sojourn time has stayed above target for a whole interval,
+    it enters the dropping state and sheds requests at a rate that grows
+    with the square root of the drop count, until a request gets through
+    in under target.
+    """
+
+    def __init__(self, target=5.0, interval=10.0):
+        self.target = target
+        self.interval = interval
+        self._first_above = None
+        self._drop_next = 0.0
+        self._count = 0
+        self.dropping = False
+        self.drops = 0
+
+    def should_drop(self, sojourn, now):
+        if sojourn < self.target:
+            self._first_above = None
+            if self.dropping:
+                logger.info("CoDel: queue delay back under target, stopped shedding")
+            self.dropping = False
+            return False
+
+        if self._first_above is None:
+            self._first_above = now + self.interval
+            return False
+
+        if not self.dropping:
+            if now < self._first_above:
+                return False
+            logger.warning(f"⚠️  CoDel: queue delay above {self.target}s for {self.interval}s, shedding")
+            self.dropping = True
+            # Resume near the previous drop rate if we were shedding recently
+            self._count = self._count - 2 if now - self._drop_next < 16 * self.interval and self._count > 2 else 1
+        elif now >= self._drop_next:
+            self._count += 1
+        else:
+            return False
+
+        self._drop_next = now + self.interval / math.sqrt(self._count)
+        self.drops += 1
+        return True
+
+    def stats(self):
+        return {
+            "target_seconds": self.target,
+            "interval_seconds": self.interval,
+            "dropping": self.dropping,
+            "drops": self.drops,
+        }
+
+
+class AIMDLimit:
+    """Additive-increase/multiplicative-decrease concurrency limit.
+
+    The limit grows by one after a full limit's worth of good samples and is
+    multiplied by backoff on an error, or when latency exceeds tolerance
+    times the baseline (the fastest recent sample, i.e. the no-queueing
+    latency). Decreases are spaced at least one baseline apart so a burst
+    of simultaneous failures only counts once.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=16, backoff=0.5, tolerance=2.0, window=100):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self._recent = deque(maxlen=window)
+        self._successes = 0
+        self._last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+
+    @property
+    def baseline(self):
+        return min(self._recent) if self._recent else None
+
+    def on_sample(self, latency, overloaded=False):
+        """Feed one completed call; returns the new limit (caller holds any needed lock).
+
+        A latency of None without overloaded (bad model output, cancellation,
+        an open breaker) says nothing about capacity and is ignored.
+        """
+        if latency is None and not overloaded:
+            return self.limit
+        if not overloaded:
+            self._recent.append(latency)
+        baseline = self.baseline
+
+        too_slow = latency is not None and baseline is not None and latency > self.tolerance * baseline
+        if overloaded or too_slow:
+            now = time.monotonic()
+            if now - self._last_decrease >= (baseline or 0.0):
+                self.limit = max(self.min_limit, int(self.limit * self.backoff))
+                self._last_decrease = now
+                self._successes = 0
+                self.decreases += 1
+            return self.limit
+
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            self.limit += 1
+            self._successes = 0
+            self.increases += 1
+        return self.limit
+
+    def stats(self):
+        baseline = self.baseline
+        return {
+            "algorithm": "aimd",
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "baseline_latency_ms": round(baseline * 1000, 1) if baseline is not None else None,
+            "latency_tolerance": self.tolerance,
+            "increases": self.increases,
+            "decreases": self.decreases,
+        }
+
+
+class AdmissionController:
+    """At most limit holders at once; up to max_queue more wait for at most max_wait seconds.
+
+    Waiters are ordered by a FairQueue (priority class, then tenant weight),
+    and no tenant may hold more than max_queue_per_tenant queue places.
+    With an adaptive limiter the limit follows observed latency and the
+    exceptions listed in overload_errors. With a CoDel shedder, requests that
+    reach the head of a persistently slow queue are rejected instead of run.
+    """
+
+    def __init__(self, limit=4, max_queue=32, max_wait=30.0, limiter=None, overload_errors=(), shedder=None,
+                 tenant_weights=None, max_queue_per_tenant=None):
+        self.limiter = limiter
+        self.shedder = shedder
+        self.limit = limiter.limit if limiter else limit
+        self.max_queue = max_queue
+        self.max_queue_per_tenant = max_queue_per_tenant or max_queue
+        self.max_wait = max_wait
+        self.overload_errors = tuple(overload_errors)
+        self._lock = threading.Lock()
+        self._waiters = FairQueue(tenant_weights)
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {}
+        self.total_wait = 0.0
+        self.max_wait_seen = 0.0
+        self._service_ewma = None
+        self.tenants = {}
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    def queue_utilisation(self):
+        return len(self._waiters) / self.max_queue if self.max_queue else 0.0
+
+    def _tenant_stats(self, tenant):
+        stats = self.tenants.get(tenant)
+        if stats is None:
+            stats = self.tenants[tenant] = {"admitted": 0, "rejected": 0, "total_wait": 0.0, "in_flight": 0}
+        return stats
+
+    def _reject(self, reason, tenant=DEFAULT_TENANT):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        self._tenant_stats(tenant)["rejected"] += 1
+        return AdmissionRejected(reason, self._retry_after())
+
+    def _retry_after(self):
+        """Rough seconds until a queue slot frees up, for the Retry-After header"""
+        service = self._service_ewma or 1.0
+        return max(1, math.ceil(service * (len(self._waiters) + 1) / max(1, self.limit)))
+
+    def _admit(self, waited, tenant):
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait += waited
+        self.max_wait_seen = max(self.max_wait_seen, waited)
+        stats = self._tenant_stats(tenant)
+        stats["admitted"] += 1
+        stats["total_wait"] += waited
+        stats["in_flight"] += 1
+
+    def acquire(self, tenant=DEFAULT_TENANT, priority=0, timeout=None):
+        """Block until admitted; raises AdmissionRejected on overflow or queue timeout.
+
+        timeout (the caller's remaining deadline) shortens the wait below
+        max_wait; running out of it is rejected as "deadline".
+        """
+        max_wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        with self._lock:
+            if max_wait <= 0:
+                raise self._reject("deadline", tenant)
+            if self.in_flight < self.limit and not self._waiters:
+                self._admit(0.0, tenant)
+                return
+            if len(self._waiters) >= self.max_queue:
+                raise self._reject("queue_full", tenant)
+            if self._waiters.depth_by_tenant.get(tenant, 0) >= self.max_queue_per_tenant:
+                raise self._reject("tenant_queue_full", tenant)
+            waiter = _Waiter(tenant, priority)
+            self._waiters.push(waiter)
+
+        waiter.event.wait(max_wait)
+
+        with self._lock:
+            if waiter.shed_reason is not None:
+                raise self._reject(waiter.shed_reason, tenant)
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                raise self._reject("queue_timeout" if max_wait >= self.max_wait else "deadline", tenant)
+
+    def release(self, service_time=None, overloaded=False, tenant=DEFAULT_TENANT):
+        with self._lock:
+            self.in_flight -= 1
+            self._tenant_stats(tenant)["in_flight"] -= 1
+            if service_time is not None and not overloaded:
+                self._service_ewma = service_time if self._service_ewma is None else 0.8 * self._service_ewma + 0.2 * service_time
+            if self.limiter is not None:
+                limit = self.limiter.on_sample(service_time, overloaded)
+                if limit != self.limit:
+                    logger.info(f"Concurrency limit {self.limit} -> {limit}")
+                    self.limit = limit
+            self._grant()
+
+    def _grant(self):
+        now = time.monotonic()
+        while self.in_flight < self.limit and self._waiters:
+            waiter = self._waiters.pop()
+            sojourn = now - waiter.enqueued_at
+            if self.shedder is not None and self.shedder.should_drop(sojourn, now):
+                waiter.shed_reason = "codel_sojourn"
+            else:
+                waiter.granted = True
+                self._admit(sojourn, waiter.tenant)
+            waiter.event.set()
+
+    def shed_waiting(self, reason):
+        """Reject every queued request right away with reason; returns how many were shed"""
+        with self._lock:
+            shed = 0
+            while self._waiters:
+                waiter = self._waiters.pop()
+                waiter.shed_reason = reason
+                waiter.event.set()
+                shed += 1
+            return shed
+
+    @contextmanager
+    def slot(self, tenant=DEFAULT_TENANT, priority=0, timeout=None):
+        self.acquire(tenant, priority, timeout)
+        start = time.monotonic()
+        try:
+            yield
+        except self.overload_errors:
+            self.release(time.monotonic() - start, overloaded=True, tenant=tenant)
+            raise
+        except BaseException:
+            # Errors unrelated to load (bad model output, cancellation) say nothing about capacity
+            self.release(None, tenant=tenant)
+            raise
+        else:
+            self.release(time.monotonic() - start, tenant=tenant)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            oldest = self._waiters.oldest_enqueued_at()
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "queue_depth": len(self._waiters),
+                "max_queue": self.max_queue,
+                "max_queue_per_tenant": self.max_queue_per_tenant,
+                "max_wait_seconds": self.max_wait,
+                "oldest_wait_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0.0,
+                "max_wait_ms": round(self.max_wait_seen * 1000, 1),
+                "service_time_ewma_ms": round(self._service_ewma * 1000, 1) if self._service_ewma is not None else None,
+                "adaptive": self.limiter.stats() if self.limiter else None,
+                "codel": self.shedder.stats() if self.shedder else None,
+                "tenants": {
+                    tenant: {
+                        "weight": self._waiters.weight(tenant),
+                        "queue_depth": self._waiters.depth_by_tenant.get(tenant, 0),
+                        "in_flight": t["in_flight"],
+                        "admitted": t["admitted"],
+                        "rejected": t["rejected"],
+                        "avg_wait_ms": round(t["total_wait"] / t["admitted"] * 1000, 1) if t["admitted"] else 0.0,
+                    }
+                    for tenant, t in self.tenants.items()
+                },
+            }
+
+
+class AsyncAdmissionController:
+    """asyncio counterpart of AdmissionController for the ASGI server.
+
+    A fixed limit with a bounded FIFO queue of coroutines; waiting costs no
+    thread. Rejections use the same AdmissionRejected reasons.
+    """
+
+    def __init__(self, limit=4, max_queue=32, max_wait=30.0):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        import asyncio  # only the ASGI server pays for importing asyncio
+        self._semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = {}
+        self.total_wait = 0.0
+
+    @property
+    def queue_depth(self):
+        return self.waiting
+
+    def queue_utilisation(self):
+        return self.waiting / self.max_queue if self.max_queue else 0.0
+
+    def _reject(self, reason):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return AdmissionRejected(reason)
+
+    @asynccontextmanager
+    async def slot(self, timeout=None):
+        """Hold one of limit places while the block runs; timeout (the caller's deadline) shortens the wait"""
+        max_wait = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue:
+                raise self._reject("queue_full")
+            if max_wait <= 0:
+                raise self._reject("deadline")
+
+        import asyncio
+        start = time.monotonic()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), max_wait)
+        except asyncio.TimeoutError:
+            raise self._reject("queue_timeout" if max_wait >= self.max_wait else "deadline")
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+        self.admitted += 1
+        self.total_wait += time.monotonic() - start
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "avg_wait_ms": round(self.total_wait / self.admitted * 1000, 1) if self.admitted else 0.0,
+        }
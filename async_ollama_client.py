@@ -0,0 +1,97 @@
+"""
+Async Ollama HTTP client
+httpx-based counterpart of OllamaClient for the ASGI server
+"""
+
+import json
+import logging
+import time
+
+import httpx
+
+from ollama_client import JsonObjectDetector, OllamaHTTPError
+
+logger = logging.getLogger(__name__)
+
+# Transport errors that mean Ollama is overloaded or unreachable
+ASYNC_OVERLOAD_ERRORS = (httpx.TimeoutException, httpx.NetworkError)
+
+
+class AsyncOllamaClient:
+    """Pooled keep-alive client for a single Ollama host; create and close it inside the event loop.
+
+    Cancelling the awaiting task leaves the streaming context, which drops
+    the connection and makes Ollama abort the generation.
+    """
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=3.0, read_timeout=120.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+            timeout=self._timeout(self.timeout),
+        )
+
+    @staticmethod
+    def _timeout(timeout):
+        connect_timeout, read_timeout = timeout
+        return httpx.Timeout(read_timeout, connect=connect_timeout)
+
+    async def generate(self, payload, timeout=None):
+        response = await self.client.post(
+            "/api/generate", json=dict(payload, stream=False), timeout=self._timeout(timeout or self.timeout)
+        )
+        if response.status_code != 200:
+            raise OllamaHTTPError(response.status_code)
+        return response.json()
+
+    async def generate_until_json(self, payload, timeout=None, start="{", deadline=None):
+        """Async OllamaClient.generate_until_json: stream until the first JSON object closes"""
+        payload = dict(payload, stream=True)
+        detector = JsonObjectDetector(start)
+        parts = []
+        tokens = 0
+        first_token = None
+
+        start = time.monotonic()
+        async with self.client.stream(
+            "POST", "/api/generate", json=payload, timeout=self._timeout(timeout or self.timeout)
+        ) as response:
+            if response.status_code != 200:
+                raise OllamaHTTPError(response.status_code)
+
+            async for line in response.aiter_lines():
+                if deadline is not None:
+                    deadline.check()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if "error" in event:
+                    raise Exception(f"Ollama error: {event['error']}")
+
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                chunk = event.get("response", "")
+                parts.append(chunk)
+                tokens += 1
+
+                obj = detector.feed(chunk)
+                if obj is not None:
+                    return {
+                        "response": obj, "done": False, "early_stop": True, "tokens": tokens,
+                        "first_token_seconds": first_token,
+                    }
+
+                if event.get("done"):
+                    return dict(
+                        event, response="".join(parts), early_stop=False, tokens=tokens, first_token_seconds=first_token
+                    )
+
+        return {
+            "response": "".join(parts), "done": False, "early_stop": False, "tokens": tokens,
+            "first_token_seconds": first_token,
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
@@ -0,0 +1,185 @@
+"""
+Dynamic micro-batching
+Collects pending items for a short window and runs them as one batch
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from deadline import Deadline, DeadlineExceeded
+from ollama_client import CancelToken
+
+logger = logging.getLogger(__name__)
+
+
+class _Pending:
+    def __init__(self, item, key, cancel, deadline):
+        self.item = item
+        self.key = key
+        self.cancel = cancel
+        self.deadline = deadline
+        self.wake = threading.Event()
+        self.finished = False
+        self.result = None
+        self.error = None
+
+    def abandoned(self):
+        """True once the submitter has stopped waiting for this item"""
+        return (self.cancel is not None and self.cancel.cancelled) or (
+            self.deadline is not None and self.deadline.expired()
+        )
+
+
+class _Wakeup:
+    """Wakes one submitter; linked to its CancelToken so cancelling the token wakes it too"""
+
+    def __init__(self, event):
+        self.event = event
+
+    def cancel(self, reason=None):
+        self.event.set()
+        return 0
+
+
+class _AllCancelled:
+    """Cancels a batch's token once every item in it has been cancelled"""
+
+    def __init__(self, token, count):
+        self.token = token
+        self.count = count
+        self._lock = threading.Lock()
+
+    def cancel(self, reason=None):
+        with self._lock:
+            self.count -= 1
+            if self.count > 0:
+                return 0
+        return self.token.cancel(reason)
+
+
+class MicroBatcher:
+    """Groups submit() calls into batches of up to max_items, waiting at most max_wait_ms.
+
+    Up to workers batches run at once, each on its own dispatcher thread;
+    only items submitted with the same key share a batch. run_batch(items,
+    cancel, deadline) must return one entry per item: a result, or an
+    exception instance for items that failed. Each submitter gets only its
+    own outcome.
+
+    A batch runs with the latest deadline of its items (none if any item
+    has none) and a CancelToken that is cancelled once every item's own
+    token has been. Items whose submitter already gave up are dropped
+    before their batch runs.
+    """
+
+    def __init__(self, run_batch, max_items=4, max_wait_ms=50, workers=1):
+        self.run_batch = run_batch
+        self.max_items = max_items
+        self.max_wait = max_wait_ms / 1000
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.item_failures = 0
+        self.skipped = 0
+        self._dispatchers = [
+            threading.Thread(target=self._dispatch_loop, name=f"micro-batcher-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for dispatcher in self._dispatchers:
+            dispatcher.start()
+
+    def submit(self, item, key=None, cancel=None, deadline=None):
+        """Blocks until the item's batch has run; raises that item's error.
+
+        Stops waiting with GenerationCancelled once cancel fires, or
+        DeadlineExceeded once deadline passes, even if the batch still runs.
+        """
+        pending = _Pending(item, key, cancel, deadline)
+        self._queue.put(pending)
+        if cancel is not None:
+            cancel.link(_Wakeup(pending.wake))
+
+        pending.wake.wait(None if deadline is None else max(0.0, deadline.remaining()))
+        if not pending.finished:
+            if cancel is not None:
+                cancel.check()
+            raise DeadlineExceeded("request deadline exceeded")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _dispatch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_items:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.key, []).append(pending)
+            for group in groups.values():
+                self._run(group)
+
+    def _run(self, batch):
+        live = [p for p in batch if not p.abandoned()]
+        with self._lock:
+            self.skipped += len(batch) - len(live)
+        if not live:
+            return
+
+        cancel = CancelToken()
+        if all(p.cancel is not None for p in live):
+            member = _AllCancelled(cancel, len(live))
+            for pending in live:
+                pending.cancel.link(member)
+        deadline = None
+        if all(p.deadline is not None for p in live):
+            deadline = Deadline(max(p.deadline.expires_at for p in live))
+
+        try:
+            results = self.run_batch([p.item for p in live], cancel, deadline)
+            if len(results) != len(live):
+                raise ValueError(f"Batch returned {len(results)} results for {len(live)} items")
+        except Exception as e:
+            logger.error(f"Batch of {len(live)} failed: {e}")
+            results = [e] * len(live)
+
+        failures = 0
+        for pending, result in zip(live, results):
+            if isinstance(result, BaseException):
+                pending.error = result
+                failures += 1
+            else:
+                pending.result = result
+            pending.finished = True
+            pending.wake.set()
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(live)
+            self.item_failures += failures
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_items": self.max_items,
+                "max_wait_ms": round(self.max_wait * 1000),
+                "workers": self.workers,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "item_failures": self.item_failures,
+                "skipped": self.skipped,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            }
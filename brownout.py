@@ -0,0 +1,98 @@
+"""
+Brownout controller
+Graded degradation of LLM usage driven by queue pressure and recent latency
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+FULL = 0       # normal service
+REDUCED = 1    # shorter prompt and generation
+AMBIGUOUS = 2  # only cases the keywords can't settle go to the LLM
+KEYWORDS = 3   # everything served by keyword analysis
+
+
+class BrownoutController:
+    """Maps pressure signals to a level from 0 (full) to 3 (keywords only).
+
+    queue_thresholds are queue utilisation fractions and latency_thresholds
+    are p90 generation latencies (seconds, over the last window seconds) at
+    which levels 1, 2 and 3 start. The level rises immediately and steps
+    down one level at a time after recovery seconds of lower pressure.
+    """
+
+    def __init__(self, queue_thresholds=(0.25, 0.5, 0.9), latency_thresholds=(15.0, 30.0, 60.0),
+                 window=60.0, recovery=30.0):
+        self.queue_thresholds = tuple(queue_thresholds)
+        self.latency_thresholds = tuple(latency_thresholds)
+        self.window = window
+        self.recovery = recovery
+        self._lock = threading.Lock()
+        self._latencies = deque()  # (timestamp, seconds)
+        self._calm_since = None
+        self.level = FULL
+        self.level_changes = 0
+        self.served = {level: 0 for level in (FULL, REDUCED, AMBIGUOUS, KEYWORDS)}
+
+    def observe_latency(self, seconds):
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+
+    def _recent_p90(self, now):
+        while self._latencies and self._latencies[0][0] < now - self.window:
+            self._latencies.popleft()
+        if not self._latencies:
+            return None
+        ordered = sorted(s for _, s in self._latencies)
+        return ordered[int(0.9 * (len(ordered) - 1))]
+
+    @staticmethod
+    def _level_for(value, thresholds):
+        if value is None:
+            return FULL
+        return sum(1 for t in thresholds if value >= t)
+
+    def update(self, queue_utilisation):
+        """Re-evaluate pressure and return the level to serve this request at"""
+        with self._lock:
+            now = time.monotonic()
+            p90 = self._recent_p90(now)
+            target = max(
+                self._level_for(queue_utilisation, self.queue_thresholds),
+                self._level_for(p90, self.latency_thresholds),
+            )
+
+            if target > self.level:
+                logger.warning(f"⚠️  Brownout level {self.level} -> {target} (queue {queue_utilisation:.0%}, p90 {p90}s)")
+                self.level = target
+                self.level_changes += 1
+                self._calm_since = None
+            elif target < self.level:
+                if self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.recovery:
+                    self.level -= 1
+                    self.level_changes += 1
+                    self._calm_since = now
+                    logger.info(f"Brownout level recovering to {self.level}")
+            else:
+                self._calm_since = None
+
+            self.served[self.level] += 1
+            return self.level
+
+    def stats(self):
+        with self._lock:
+            p90 = self._recent_p90(time.monotonic())
+            return {
+                "level": self.level,
+                "recent_p90_latency_seconds": round(p90, 2) if p90 is not None else None,
+                "queue_thresholds": list(self.queue_thresholds),
+                "latency_thresholds_seconds": list(self.latency_thresholds),
+                "level_changes": self.level_changes,
+                "served_by_level": {str(k): v for k, v in self.served.items()},
+            }
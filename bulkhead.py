@@ -0,0 +1,70 @@
+"""
+Bulkheads
+Independent concurrency caps so one slow class of work cannot take every thread
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class BulkheadFull(Exception):
+    """Raised when a bulkhead has no free place within its wait time"""
+
+    def __init__(self, name):
+        super().__init__(f"Bulkhead '{name}' is full")
+        self.name = name
+
+
+class Bulkhead:
+    """Semaphore bulkhead: at most max_concurrent callers inside, others wait up to max_wait seconds"""
+
+    def __init__(self, name, max_concurrent, max_wait=0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.entered = 0
+        self.rejected = 0
+
+    def enter(self):
+        """Take a place or raise BulkheadFull; pair with leave(), which may run on another thread"""
+        if self.max_wait > 0:
+            acquired = self._semaphore.acquire(timeout=self.max_wait)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise BulkheadFull(self.name)
+
+        with self._lock:
+            self.active += 1
+            self.entered += 1
+            self.peak = max(self.peak, self.active)
+
+    def leave(self):
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def guard(self):
+        self.enter()
+        try:
+            yield
+        finally:
+            self.leave()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_wait_seconds": self.max_wait,
+                "active": self.active,
+                "peak": self.peak,
+                "entered": self.entered,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,122 @@
+"""
+Circuit breaker
+Fails fast while a backend is down and lets a single probe test recovery
+"""
+
+import threading
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the backend while the circuit is open"""
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures.
+
+    After recovery_timeout seconds the next call is let through as a probe
+    (half-open); its success closes the circuit, its failure re-opens it.
+    Exceptions listed in ignore (e.g. deliberate cancellation) say nothing
+    about backend health and leave the state unchanged.
+    """
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0, ignore=()):
+        self.name = name
+        self.ignore = tuple(ignore)
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+        return self._state
+
+    def is_open(self):
+        """Cheap check for callers that want to skip the backend entirely (does not take the probe)"""
+        with self._lock:
+            state = self._current_state()
+            if state == OPEN or (state == HALF_OPEN and self._probe_in_flight):
+                self.rejected += 1
+                return True
+            return False
+
+    def allow(self):
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.total_successes += 1
+            self._failures = 0
+            self._probe_in_flight = False
+            self._state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.times_opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a probe permit without recording an outcome"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = fn(*args, **kwargs)
+        except self.ignore:
+            self.release()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        with self._lock:
+            state = self._current_state()
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout_seconds": self.recovery_timeout,
+                "open_for_seconds": round(time.monotonic() - self._opened_at, 1) if state != CLOSED else 0.0,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "successes": self.total_successes,
+                "failures": self.total_failures,
+            }
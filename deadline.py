@@ -0,0 +1,74 @@
+"""
+Request deadlines
+Caller deadlines from request headers, carried through to the Ollama timeouts
+"""
+
+import math
+import time
+
+from ollama_client import GenerationCancelled
+
+# grpc-timeout units (https://github.com/grpc/grpc/blob/master/doc/PROTOCOL-HTTP2.md)
+GRPC_TIMEOUT_UNITS = {"H": 3600.0, "M": 60.0, "S": 1.0, "m": 1e-3, "u": 1e-6, "n": 1e-9}
+
+
+class DeadlineExceeded(GenerationCancelled):
+    """Raised when the caller's deadline passes; like a cancellation it says nothing about Ollama's health"""
+
+
+class Deadline:
+    """A point on the monotonic clock after which the caller no longer wants the answer"""
+
+    def __init__(self, expires_at):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after(cls, seconds):
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded("request deadline exceeded")
+
+    def timeout(self, connect_timeout, read_timeout):
+        """(connect, read) timeouts for requests, capped at the time left; raises once it has passed"""
+        self.check()
+        remaining = self.remaining()
+        return min(connect_timeout, remaining), min(read_timeout, remaining)
+
+
+def parse_grpc_timeout(value):
+    """Seconds from a grpc-timeout value such as '1500m' or '2S'; None if malformed"""
+    value = value.strip()
+    if len(value) < 2 or value[-1] not in GRPC_TIMEOUT_UNITS or not value[:-1].isdigit():
+        return None
+    return int(value[:-1]) * GRPC_TIMEOUT_UNITS[value[-1]]
+
+
+def deadline_from_headers(headers, deadline_header, timeout_header, max_seconds=None):
+    """Deadline from an absolute Unix-time header or a grpc-timeout style header; None if neither is set.
+
+    The absolute form is converted to the monotonic clock on arrival, so a
+    wall-clock jump afterwards does not move it. max_seconds caps the budget;
+    non-finite values (nan, inf) are ignored like malformed ones.
+    """
+    seconds = None
+    absolute = headers.get(deadline_header)
+    if absolute:
+        try:
+            seconds = float(absolute) - time.time()
+        except ValueError:
+            seconds = None
+    if seconds is None and headers.get(timeout_header):
+        seconds = parse_grpc_timeout(headers.get(timeout_header))
+    if seconds is None or not math.isfinite(seconds):
+        return None
+    if max_seconds is not None:
+        seconds = min(seconds, max_seconds)
+    return Deadline.after(seconds)
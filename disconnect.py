@@ -0,0 +1,132 @@
+"""
+Client disconnect watcher
+Cancels in-flight work once the client that asked for it hangs up
+"""
+
+import logging
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# CancelToken reason for requests whose client hung up
+DISCONNECT_REASON = "client disconnected"
+
+# WSGI environ keys under which servers expose the client connection
+SOCKET_ENVIRON_KEYS = ("gunicorn.socket", "werkzeug.socket")
+
+
+def client_socket(environ):
+    """The client's socket from a WSGI environ, or None if the server does not expose it"""
+    for key in SOCKET_ENVIRON_KEYS:
+        sock = environ.get(key)
+        if sock is not None:
+            return sock
+    return None
+
+
+def _hung_up(sock):
+    """True once the peer has closed; only meaningful after the request body has been read"""
+    try:
+        return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) == b""
+    except (BlockingIOError, InterruptedError):
+        return False
+    except OSError:
+        return True
+
+
+class DisconnectWatcher:
+    """One daemon thread polls every watched client socket and cancels the token of any that hung up.
+
+    A closed connection shows up as readable with nothing to read. Sockets
+    carrying a pipelined next request are readable with data and are left alone.
+    """
+
+    def __init__(self, poll_interval=0.5):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._watched = {}  # id -> (socket, CancelToken)
+        self._next_id = 0
+        self._thread = None
+        self.watched_total = 0
+        self.disconnects = 0
+        self.generations_aborted = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="disconnect-watcher", daemon=True)
+                self._thread.start()
+        return self
+
+    @contextmanager
+    def watch(self, sock, token):
+        """Cancel token if sock's peer disconnects while the block runs"""
+        if sock is None:
+            yield
+            return
+
+        with self._lock:
+            watch_id = self._next_id
+            self._next_id += 1
+            self._watched[watch_id] = (sock, token)
+            self.watched_total += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watched.pop(watch_id, None)
+
+    def _loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Disconnect watcher poll failed: {e}")
+
+    def poll(self):
+        with self._lock:
+            watched = list(self._watched.items())
+        if not watched:
+            return
+
+        by_fd = {}
+        for watch_id, (sock, token) in watched:
+            try:
+                by_fd[sock.fileno()] = (watch_id, sock, token)
+            except OSError:
+                continue
+        by_fd.pop(-1, None)
+        if not by_fd:
+            return
+
+        # poll() rather than select(), which fails outright on any descriptor >= FD_SETSIZE (1024)
+        poller = select.poll()
+        for fd in by_fd:
+            poller.register(fd, select.POLLIN)
+        for fd, _ in poller.poll(0):
+            watch_id, sock, token = by_fd[fd]
+            if not _hung_up(sock):
+                continue
+            with self._lock:
+                if self._watched.pop(watch_id, None) is None:
+                    continue
+                self.disconnects += 1
+            aborted = token.cancel(DISCONNECT_REASON)
+            logger.info(f"Client disconnected, aborted {aborted} Ollama stream(s)")
+            with self._lock:
+                self.generations_aborted += aborted
+
+    def stats(self):
+        with self._lock:
+            return {
+                "poll_interval_seconds": self.poll_interval,
+                "watching": len(self._watched),
+                "watched_total": self.watched_total,
+                "disconnects": self.disconnects,
+                "generations_aborted": self.generations_aborted,
+            }
@@ -0,0 +1,153 @@
+"""
+Graceful drain
+Stop taking new LLM work on shutdown, let in-flight requests finish, then cut over to keywords
+"""
+
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# CancelToken reason used when the drain deadline cuts a generation short
+DRAIN_REASON = "server draining"
+
+
+class Drainer:
+    """Tracks in-flight requests and runs the shutdown sequence once begin() is called.
+
+    In-flight requests get deadline seconds to finish normally. After that
+    every tracked CancelToken is cancelled with DRAIN_REASON and the
+    on_cutover callbacks run, so remaining requests answer from the keyword
+    fallback within grace seconds. The on_finish callbacks (cache flushes)
+    run exactly once at the end, or at interpreter exit if that comes first.
+    """
+
+    def __init__(self, deadline=20.0, grace=5.0):
+        self.deadline = deadline
+        self.grace = grace
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._inflight = {}  # id -> CancelToken
+        self._next_id = 0
+        self._on_cutover = []
+        self._on_finish = []
+        self._finished = False
+        self.draining = False
+        self.cut_over = False
+        self.started_at = None
+        self.finished_at = None
+        self.drained_normally = 0
+        self.cut_over_requests = 0
+
+    def on_cutover(self, fn):
+        self._on_cutover.append(fn)
+
+    def on_finish(self, fn):
+        self._on_finish.append(fn)
+
+    @contextmanager
+    def track(self, token):
+        """Count a request as in flight; token is cancelled if it outlives the drain deadline"""
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._inflight[request_id] = token
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._inflight.pop(request_id, None)
+                if self.draining and not self.cut_over:
+                    self.drained_normally += 1
+                self._idle.notify_all()
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def wait_idle(self, timeout):
+        """Block until nothing is in flight or timeout passes; True if idle"""
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._inflight, timeout)
+
+    def begin(self, reason="shutdown"):
+        """Start draining on a background thread; False if a drain is already running"""
+        with self._lock:
+            if self.draining:
+                return False
+            self.draining = True
+            self.started_at = time.monotonic()
+            in_flight = len(self._inflight)
+        logger.warning(f"⚠️  Draining ({reason}): {in_flight} request(s) in flight, deadline {self.deadline:g}s")
+        threading.Thread(target=self._run, name="drain", daemon=True).start()
+        return True
+
+    def _run(self):
+        if not self.wait_idle(self.deadline):
+            with self._lock:
+                self.cut_over = True
+                tokens = list(self._inflight.values())
+                self.cut_over_requests = len(tokens)
+            logger.warning(f"⚠️  Drain deadline passed, switching {len(tokens)} request(s) to keywords")
+            for token in tokens:
+                token.cancel(DRAIN_REASON)
+            for fn in self._on_cutover:
+                self._call(fn)
+            if not self.wait_idle(self.grace):
+                logger.error(f"Drain grace period over with {self.in_flight} request(s) still running")
+        self.finish()
+
+    def finish(self):
+        """Run the on_finish callbacks once"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self.finished_at = time.monotonic()
+        for fn in self._on_finish:
+            self._call(fn)
+        if self.started_at is not None:
+            logger.info(f"✅ Drain complete in {self.finished_at - self.started_at:.1f}s")
+
+    @staticmethod
+    def _call(fn):
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Drain step {getattr(fn, '__name__', fn)} failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "draining": self.draining,
+                "cut_over": self.cut_over,
+                "in_flight": len(self._inflight),
+                "deadline_seconds": self.deadline,
+                "grace_seconds": self.grace,
+                "drained_normally": self.drained_normally,
+                "cut_over_requests": self.cut_over_requests,
+                "drain_seconds": round((self.finished_at or time.monotonic()) - self.started_at, 1)
+                if self.started_at is not None else None,
+            }
+
+
+def install_drain_handler(drainer, signals=(signal.SIGTERM,)):
+    """Begin draining on signals, then hand the signal to whatever handler was installed before.
+
+    The previous handler (gunicorn's worker exit, for example) still runs, so
+    the server stops accepting connections while in-flight requests drain.
+    Must be called from the main thread.
+    """
+    for signum in signals:
+        previous = signal.getsignal(signum)
+
+        def handler(signum, frame, previous=previous):
+            drainer.begin(signal.Signals(signum).name)
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signum, handler)
@@ -0,0 +1,97 @@
+"""
+Background health prober
+Checks a dependency on a fixed interval and caches the outcome
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class HealthProber:
+    """Calls probe() every interval seconds on a daemon thread.
+
+    probe() returns normally when healthy and raises otherwise. Readers get
+    the cached outcome from snapshot() without touching the dependency.
+    """
+
+    def __init__(self, name, probe, interval=5.0):
+        self.name = name
+        self.probe = probe
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._ok = None  # unknown until the first probe finishes
+        self._error = None
+        self._latency = None
+        self._probed_at = None
+        self._changed_at = time.monotonic()
+        self.probes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=f"{self.name}-prober", daemon=True)
+                self._thread.start()
+        return self
+
+    def probe_now(self):
+        """Ask the prober thread to run a probe without waiting for the interval"""
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self.run_once()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_once(self):
+        start = time.monotonic()
+        try:
+            self.probe()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        end = time.monotonic()
+
+        with self._lock:
+            if ok != self._ok:
+                if self._ok is not None:
+                    logger.info(f"{self.name} is now {'up' if ok else 'down'}" + (f": {error}" if error else ""))
+                self._changed_at = end
+            self._ok = ok
+            self._error = error
+            self._latency = end - start
+            self._probed_at = end
+            self.probes += 1
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.failures += 1
+                self.consecutive_failures += 1
+        return ok
+
+    @property
+    def ok(self):
+        with self._lock:
+            return bool(self._ok)
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "ok": self._ok,
+                "error": self._error,
+                "last_probe_age_seconds": round(now - self._probed_at, 3) if self._probed_at is not None else None,
+                "last_probe_latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+                "state_age_seconds": round(now - self._changed_at, 1),
+                "probe_interval_seconds": self.interval,
+                "probes": self.probes,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+            }
@@ -0,0 +1,145 @@
+"""
+Hedged requests
+Sends a backup request when the first one is slower than the observed p95
+"""
+
+import logging
+import queue
+import threading
+from collections import deque
+
+from ollama_client import CancelToken
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies for percentile estimates"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p):
+        """p-th percentile in seconds, or None until min_samples have been seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """Token bucket that caps hedges to a fraction of requests.
+
+    Every request deposits ratio tokens (up to burst); a hedge spends one.
+    """
+
+    def __init__(self, ratio=0.05, burst=5):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.denied = 0
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.hedges += 1
+                return True
+            self.denied += 1
+            return False
+
+    def record_win(self, hedge_won):
+        if hedge_won:
+            with self._lock:
+                self.hedge_wins += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "denied": self.denied,
+                "hedge_rate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+                "max_hedge_rate": self.ratio,
+            }
+
+
+def run_hedged(attempt, delay, budget, executor, cancel=None, accept=None):
+    """Run attempt(0, token); if it is still pending after delay seconds, also run attempt(1, token).
+
+    The first attempt to return an accepted value wins and the other is
+    cancelled through its token. An attempt that raises or returns a value
+    accept() rejects only loses the race; if nothing is accepted, the last
+    rejected value is returned, or the last error re-raised. Returns
+    (value, hedge_won).
+    """
+    tokens = [CancelToken(), CancelToken()]
+    if cancel is not None:
+        for token in tokens:
+            cancel.link(token)
+
+    outcomes = queue.Queue()
+
+    def launch(index):
+        def run():
+            try:
+                outcomes.put((index, attempt(index, tokens[index]), None))
+            except Exception as e:
+                outcomes.put((index, None, e))
+        executor.submit(run)
+
+    budget.on_request()
+    launch(0)
+    pending = 1
+    hedged = False
+    error = None
+    rejected = None
+
+    while pending:
+        try:
+            index, value, err = outcomes.get(timeout=None if hedged else delay)
+        except queue.Empty:
+            hedged = True
+            if budget.try_spend():
+                logger.info(f"Hedging request after {delay:.1f}s")
+                launch(1)
+                pending += 1
+            continue
+
+        pending -= 1
+        if err is None and (accept is None or accept(value)):
+            for other, token in enumerate(tokens):
+                if other != index:
+                    token.cancel("lost hedge race")
+            budget.record_win(index == 1)
+            return value, index == 1
+
+        if err is None:
+            rejected = (value, index == 1)
+        else:
+            error = err
+        # A primary that already finished leaves nothing to hedge against
+        if index == 0 and not hedged:
+            break
+
+    if rejected is not None:
+        return rejected
+    raise error
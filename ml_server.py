@@ -3,12 +3,40 @@ Simplified Ollama Mental Health Server
 Optimized for slower systems
 """
 
+# Started before the other imports so the startup report includes them
+from startup import StartupTimer
+
+startup = StartupTimer()
+
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+import atexit
+import contextlib
+import contextvars
+import functools
+import hmac
 import logging
-import requests
 import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from admission import DEFAULT_TENANT, PRIORITIES, AIMDLimit, AdmissionController, AdmissionRejected, CoDel
+from batching import MicroBatcher
+from brownout import AMBIGUOUS, FULL, KEYWORDS, REDUCED, BrownoutController
+from bulkhead import Bulkhead, BulkheadFull
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from deadline import Deadline, DeadlineExceeded, deadline_from_headers
+from disconnect import DISCONNECT_REASON, DisconnectWatcher, client_socket
+from drain import DRAIN_REASON, Drainer, install_drain_handler
+from health_probe import HealthProber
+from hedging import HedgeBudget, LatencyTracker, run_hedged
+from model_residency import ModelResidency
+from ollama_client import OVERLOAD_ERRORS, BackendPool, CancelToken, GenerationCancelled, OllamaClient, OllamaHTTPError
+from result_cache import DiskResultCache, ResultCache, symptom_cache_key
+from singleflight import SingleFlight
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,9 +44,259 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+# Largest /predict body accepted; bigger ones get a 413 before any work is done
+MAX_REQUEST_BYTES = int(os.environ.get("MAX_REQUEST_BYTES", str(64 * 1024)))
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_BYTES
+
+# "production" serves through gunicorn (serve.py), "dev" through Flask's development server;
+# production falls back to dev with a warning when gunicorn is not installed
+SERVER_MODE = os.environ.get("SERVER_MODE", "production")
+FLASK_DEBUG = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+OLLAMA_URL = f"{OLLAMA_HOST}/api/generate"
 MODEL_NAME = "tinyllama"
 
+# Shared connection pool for all Ollama traffic
+OLLAMA_POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "10"))
+OLLAMA_POOL_BLOCK = os.environ.get("OLLAMA_POOL_BLOCK", "false").lower() == "true"
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "3"))
+OLLAMA_READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "120"))  # 2 minutes max
+
+# Comma-separated list of Ollama instances; each request goes to the least busy one
+OLLAMA_HOSTS = [h.strip() for h in os.environ.get("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if h.strip()]
+BACKEND_EJECT_AFTER_FAILURES = int(os.environ.get("BACKEND_EJECT_AFTER_FAILURES", "3"))
+BACKEND_EJECT_SECONDS = float(os.environ.get("BACKEND_EJECT_SECONDS", "30"))
+
+backends = BackendPool(
+    [
+        OllamaClient(
+            host,
+            pool_size=OLLAMA_POOL_SIZE,
+            connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+            read_timeout=OLLAMA_READ_TIMEOUT,
+            pool_block=OLLAMA_POOL_BLOCK,
+        )
+        for host in OLLAMA_HOSTS
+    ],
+    eject_after=BACKEND_EJECT_AFTER_FAILURES,
+    eject_seconds=BACKEND_EJECT_SECONDS,
+)
+
+# Stream tokens and close the generation once the JSON verdict is complete
+OLLAMA_STREAMING = os.environ.get("OLLAMA_STREAMING", "true").lower() == "true"
+
+# Bump whenever the prompt or generation options change so cached verdicts are not reused
+PROMPT_VERSION = "v1"
+MAX_PROMPT_SYMPTOMS = 10
+OLLAMA_OPTIONS = {
+    "temperature": 0.2,
+    "num_predict": 100,  # Limit response length
+}
+
+# In-memory verdict cache keyed by the normalized symptom set
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "3600"))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")  # admin endpoints are disabled until this is set
+
+result_cache = ResultCache(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+
+# On-disk verdict cache that survives restarts (set DISK_CACHE_PATH="" to disable)
+DISK_CACHE_PATH = os.environ.get("DISK_CACHE_PATH", "ml_cache.db")
+DISK_CACHE_TTL_SECONDS = float(os.environ.get("DISK_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MODEL_DIGEST_REFRESH_SECONDS = float(os.environ.get("MODEL_DIGEST_REFRESH_SECONDS", "300"))
+
+disk_cache = None
+if DISK_CACHE_PATH:
+    try:
+        disk_cache = DiskResultCache(DISK_CACHE_PATH, ttl=DISK_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning(f"⚠️  Disk cache unavailable ({DISK_CACHE_PATH}): {e}")
+
+# Fail fast to the keyword path while Ollama is down
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.environ.get("BREAKER_RECOVERY_SECONDS", "30"))
+
+breaker = CircuitBreaker(
+    "ollama",
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=BREAKER_RECOVERY_SECONDS,
+    ignore=(GenerationCancelled,),
+)
+
+# Race the LLM against the keyword verdict under a per-request latency budget (0 disables)
+LLM_LATENCY_BUDGET_SECONDS = float(os.environ.get("LLM_LATENCY_BUDGET_SECONDS", "0"))
+LLM_BUDGET_OVERRUN = os.environ.get("LLM_BUDGET_OVERRUN", "continue")  # "continue" warms the cache, "cancel" aborts
+LLM_WORKERS = int(os.environ.get("LLM_WORKERS", "8"))
+
+# Budget-raced generations waiting for an LLM worker; beyond this the request gets keywords
+LLM_MAX_QUEUED = int(os.environ.get("LLM_MAX_QUEUED", "0"))
+
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+# Caps what the executor holds, including generations left running past their budget
+llm_pool_bulkhead = Bulkhead("llm-pool", LLM_WORKERS + LLM_MAX_QUEUED)
+
+# Cancel token of the request being served, picked up by generate_text
+current_cancel = contextvars.ContextVar("current_cancel", default=None)
+
+# Caller deadline: absolute Unix time in X-Request-Deadline, or a grpc-timeout style budget ("1500m")
+DEADLINE_HEADER = os.environ.get("DEADLINE_HEADER", "X-Request-Deadline")
+TIMEOUT_HEADER = os.environ.get("TIMEOUT_HEADER", "Grpc-Timeout")
+DEADLINE_MIN_LLM_SECONDS = float(os.environ.get("DEADLINE_MIN_LLM_SECONDS", "2"))  # less left goes straight to keywords
+DEADLINE_RESPONSE_MARGIN_SECONDS = float(os.environ.get("DEADLINE_RESPONSE_MARGIN_SECONDS", "0.2"))
+DEADLINE_MAX_SECONDS = float(os.environ.get("DEADLINE_MAX_SECONDS", str(OLLAMA_READ_TIMEOUT)))  # longer budgets are capped
+
+# Deadline of the request being served, picked up by generate_text and generate_admitted
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+# Abort the Ollama stream when the client hangs up mid-generation (needs OLLAMA_STREAMING)
+CANCEL_ON_DISCONNECT = os.environ.get("CANCEL_ON_DISCONNECT", "true").lower() == "true"
+DISCONNECT_POLL_SECONDS = float(os.environ.get("DISCONNECT_POLL_SECONDS", "0.5"))
+
+disconnect_watcher = DisconnectWatcher(poll_interval=DISCONNECT_POLL_SECONDS)
+
+# Background Ollama health probing; /health only reads the cached result
+HEALTH_PROBE_INTERVAL_SECONDS = float(os.environ.get("HEALTH_PROBE_INTERVAL_SECONDS", "5"))
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+READY_REQUIRES_OLLAMA = os.environ.get("READY_REQUIRES_OLLAMA", "false").lower() == "true"
+
+# Keep the model resident in Ollama and re-warm it after eviction
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+RESIDENCY_ENABLED = os.environ.get("RESIDENCY_ENABLED", "true").lower() == "true"
+RESIDENCY_POLL_SECONDS = float(os.environ.get("RESIDENCY_POLL_SECONDS", "30"))
+
+residency = {
+    b.name: ModelResidency(b.client, MODEL_NAME, keep_alive=OLLAMA_KEEP_ALIVE, poll_interval=RESIDENCY_POLL_SECONDS)
+    for b in backends.backends
+}
+
+# Optional micro-batching of concurrent assessments into one generation
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "false").lower() == "true"
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "4"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+
+# Hedge slow generations onto a second backend after the observed p95 latency
+HEDGING_ENABLED = os.environ.get("HEDGING_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATE = float(os.environ.get("HEDGE_MAX_RATE", "0.05"))  # hedges per request
+HEDGE_BURST = int(os.environ.get("HEDGE_BURST", "5"))
+
+generation_latency = LatencyTracker()
+hedge_budget = HedgeBudget(ratio=HEDGE_MAX_RATE, burst=HEDGE_BURST)
+hedge_executor = ThreadPoolExecutor(max_workers=2 * LLM_WORKERS, thread_name_prefix="hedge")
+
+# Bounded concurrency and queueing in front of Ollama; overflow is rejected with 429 or sent to keywords
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", "30"))
+ADMISSION_OVERFLOW = os.environ.get("ADMISSION_OVERFLOW", "fallback")  # "fallback" or "reject"
+
+# Let the concurrency limit follow observed Ollama latency and errors (AIMD)
+ADAPTIVE_CONCURRENCY = os.environ.get("ADAPTIVE_CONCURRENCY", "false").lower() == "true"
+ADAPTIVE_MIN_LIMIT = int(os.environ.get("ADAPTIVE_MIN_LIMIT", "1"))
+ADAPTIVE_MAX_LIMIT = int(os.environ.get("ADAPTIVE_MAX_LIMIT", "16"))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.environ.get("ADAPTIVE_LATENCY_TOLERANCE", "2.0"))
+ADAPTIVE_BACKOFF = float(os.environ.get("ADAPTIVE_BACKOFF", "0.5"))
+
+# Shed queued LLM work once queue delay stays above target for an interval (CoDel)
+CODEL_ENABLED = os.environ.get("CODEL_ENABLED", "false").lower() == "true"
+CODEL_TARGET_SECONDS = float(os.environ.get("CODEL_TARGET_SECONDS", "5"))
+CODEL_INTERVAL_SECONDS = float(os.environ.get("CODEL_INTERVAL_SECONDS", "10"))
+
+# Per-tenant weighted fair queuing with interactive/batch priority classes
+TENANT_HEADER = os.environ.get("TENANT_HEADER", "X-Tenant-Id")
+PRIORITY_HEADER = os.environ.get("PRIORITY_HEADER", "X-Priority")
+TENANT_WEIGHTS = {
+    name.strip(): float(weight)
+    for name, weight in (pair.split(":") for pair in os.environ.get("TENANT_WEIGHTS", "").split(",") if ":" in pair)
+}
+TENANT_PRIORITIES = {
+    name.strip(): priority.strip()
+    for name, priority in (pair.split(":") for pair in os.environ.get("TENANT_PRIORITIES", "").split(",") if ":" in pair)
+}
+# Unlisted tenants (and requests without a tenant) start here, so leaving out or inventing a tenant never outranks a listed one
+TENANT_DEFAULT_PRIORITY = os.environ.get("TENANT_DEFAULT_PRIORITY", "batch").strip().lower()
+TENANT_MAX_QUEUE = int(os.environ.get("TENANT_MAX_QUEUE", str(ADMISSION_MAX_QUEUE)))
+MAX_TRACKED_TENANTS = int(os.environ.get("MAX_TRACKED_TENANTS", "100"))
+
+# (tenant, priority) of the request being served, picked up by generate_admitted
+current_tenant = contextvars.ContextVar("current_tenant", default=(DEFAULT_TENANT, PRIORITIES["interactive"]))
+_seen_tenants = set(TENANT_WEIGHTS)
+_seen_tenants_lock = threading.Lock()
+
+admission = AdmissionController(
+    limit=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_wait=ADMISSION_MAX_WAIT_SECONDS,
+    limiter=AIMDLimit(
+        initial=ADMISSION_MAX_CONCURRENCY,
+        min_limit=ADAPTIVE_MIN_LIMIT,
+        max_limit=ADAPTIVE_MAX_LIMIT,
+        backoff=ADAPTIVE_BACKOFF,
+        tolerance=ADAPTIVE_LATENCY_TOLERANCE,
+    ) if ADAPTIVE_CONCURRENCY else None,
+    overload_errors=OVERLOAD_ERRORS + (OllamaHTTPError,),
+    shedder=CoDel(target=CODEL_TARGET_SECONDS, interval=CODEL_INTERVAL_SECONDS) if CODEL_ENABLED else None,
+    tenant_weights=TENANT_WEIGHTS,
+    max_queue_per_tenant=TENANT_MAX_QUEUE,
+)
+
+# Graded degradation under pressure: 1 = shorter prompts, 2 = only ambiguous cases, 3 = keywords only
+BROWNOUT_ENABLED = os.environ.get("BROWNOUT_ENABLED", "false").lower() == "true"
+BROWNOUT_QUEUE_THRESHOLDS = [float(x) for x in os.environ.get("BROWNOUT_QUEUE_THRESHOLDS", "0.25,0.5,0.9").split(",")]
+BROWNOUT_LATENCY_THRESHOLDS = [float(x) for x in os.environ.get("BROWNOUT_LATENCY_THRESHOLDS", "15,30,60").split(",")]
+BROWNOUT_RECOVERY_SECONDS = float(os.environ.get("BROWNOUT_RECOVERY_SECONDS", "30"))
+BROWNOUT_MAX_SYMPTOMS = int(os.environ.get("BROWNOUT_MAX_SYMPTOMS", "5"))
+BROWNOUT_NUM_PREDICT = int(os.environ.get("BROWNOUT_NUM_PREDICT", "60"))
+BROWNOUT_KEYWORD_CONFIDENCE = float(os.environ.get("BROWNOUT_KEYWORD_CONFIDENCE", "0.7"))
+
+brownout = BrownoutController(
+    queue_thresholds=BROWNOUT_QUEUE_THRESHOLDS,
+    latency_thresholds=BROWNOUT_LATENCY_THRESHOLDS,
+    recovery=BROWNOUT_RECOVERY_SECONDS,
+) if BROWNOUT_ENABLED else None
+
+# Separate concurrency caps so threads stuck on Ollama never starve keyword answers or probes
+BULKHEAD_LLM_SIZE = int(os.environ.get("BULKHEAD_LLM_SIZE", "16"))
+BULKHEAD_LIGHT_SIZE = int(os.environ.get("BULKHEAD_LIGHT_SIZE", "32"))
+BULKHEAD_LIGHT_WAIT_SECONDS = float(os.environ.get("BULKHEAD_LIGHT_WAIT_SECONDS", "1"))
+BULKHEAD_OPS_SIZE = int(os.environ.get("BULKHEAD_OPS_SIZE", "8"))
+BULKHEAD_OPS_WAIT_SECONDS = float(os.environ.get("BULKHEAD_OPS_WAIT_SECONDS", "1"))
+
+llm_bulkhead = Bulkhead("llm", BULKHEAD_LLM_SIZE)
+light_bulkhead = Bulkhead("light", BULKHEAD_LIGHT_SIZE, max_wait=BULKHEAD_LIGHT_WAIT_SECONDS)
+ops_bulkhead = Bulkhead("ops", BULKHEAD_OPS_SIZE, max_wait=BULKHEAD_OPS_WAIT_SECONDS)
+
+# Graceful shutdown: on SIGTERM readiness turns false, new requests get keyword verdicts and in-flight
+# LLM calls get DRAIN_DEADLINE_SECONDS to finish before they are switched to keywords as well
+DRAIN_DEADLINE_SECONDS = float(os.environ.get("DRAIN_DEADLINE_SECONDS", "20"))
+DRAIN_GRACE_SECONDS = float(os.environ.get("DRAIN_GRACE_SECONDS", "5"))
+
+drainer = Drainer(deadline=DRAIN_DEADLINE_SECONDS, grace=DRAIN_GRACE_SECONDS)
+
+
+def shed_admission_queue():
+    shed = admission.shed_waiting(DRAIN_REASON)
+    if shed:
+        logger.info(f"Drain released {shed} queued request(s) to keywords")
+
+
+def flush_pending_writes():
+    if disk_cache and not disk_cache.flush(timeout=DRAIN_GRACE_SECONDS):
+        logger.warning(f"⚠️  Disk cache still had {disk_cache.stats()['pending_writes']} unwritten entries at shutdown")
+
+
+drainer.on_cutover(shed_admission_queue)
+drainer.on_finish(flush_pending_writes)
+# Flush on any clean exit, drained or not
+atexit.register(drainer.finish)
+
+# Identical assessments in flight at the same time share one Ollama generation
+inflight = SingleFlight()
+
+_model_digest = {"value": None, "checked_at": float("-inf"), "refreshing": False}
+_model_digest_lock = threading.Lock()
+
 # Simplified keywords for fallback
 CONDITION_KEYWORDS = {
     "Depression": ["sad", "hopeless", "empty", "tired", "worthless", "sleep"],
@@ -28,131 +306,503 @@ CONDITION_KEYWORDS = {
     "Aspergers": ["social", "routine", "literal", "sensory"],
 }
 
+VALID_CONDITIONS = ["Depression", "Anxiety", "ADHD", "PTSD", "Aspergers", "No disorder detected"]
+VALID_SEVERITIES = ["Mild", "Moderate", "Significant", "Minimal", "Uncertain"]
+
+
+def probe_backend(client):
+    """Cheap liveness check against /api/tags; raises if Ollama or the model is missing"""
+    response = client.get("/api/tags", timeout=(OLLAMA_CONNECT_TIMEOUT, HEALTH_PROBE_TIMEOUT_SECONDS))
+    if response.status_code != 200:
+        raise Exception(f"Ollama returned {response.status_code}")
+    
+    names = {m.get("name") for m in response.json().get("models", [])}
+    if MODEL_NAME not in names and f"{MODEL_NAME}:latest" not in names:
+        raise Exception(f"Model {MODEL_NAME} is not installed")
+
+
+def probe_ollama():
+    """Probe every backend, ejecting or restoring each; raises if none is healthy"""
+    errors = []
+    for backend in backends.backends:
+        try:
+            probe_backend(backend.client)
+            backends.record_probe(backend, True)
+        except Exception as e:
+            backends.record_probe(backend, False, e)
+            errors.append(f"{backend.name}: {e}")
+    
+    if len(errors) == len(backends.backends):
+        raise Exception("; ".join(errors))
+
 
-def test_ollama_connection():
-    """Quick test if Ollama is responsive"""
+def probe_ollama_at_startup():
+    """probe_ollama for the background prober; the first outcome is logged and timed"""
     try:
-        response = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": MODEL_NAME,
-                "prompt": "Say 'OK'",
-                "stream": False
-            },
-            timeout=10
-        )
-        return response.status_code == 200
-    except:
+        probe_ollama()
+    except Exception:
+        if startup.mark("first_probe"):
+            logger.warning("⚠️  Ollama is slow/unavailable - will use keyword fallback")
+        raise
+    if startup.mark("first_probe"):
+        logger.info("✅ Ollama is responding")
+    startup.mark("ollama_ready")
+    note_ready()
+
+
+ollama_prober = HealthProber("ollama", probe_ollama_at_startup, interval=HEALTH_PROBE_INTERVAL_SECONDS)
+
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def start_background():
+    """Start probing, model warm-up and the disconnect watcher; returns at once.
+
+    Called once the server is listening (or on the first request), so a slow
+    or missing Ollama never delays the bind, and a gunicorn master that only
+    imports this module starts none of it.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    
+    ollama_prober.start()
+    # Until the digest is known disk reads are off and new entries are keyed without it
+    current_model_digest()
+    if RESIDENCY_ENABLED:
+        for manager in residency.values():
+            manager.start()
+    if CANCEL_ON_DISCONNECT:
+        disconnect_watcher.start()
+
+
+def mark_bound():
+    """Record that the server is accepting connections and start the background work"""
+    startup.mark("bound")
+    start_background()
+    note_ready()
+
+
+def note_ready():
+    """Record first-ready once the server is listening and readiness would pass"""
+    if startup.has("bound") and (startup.has("ollama_ready") or not READY_REQUIRES_OLLAMA):
+        startup.mark("ready")
+
+
+def refresh_model_digest():
+    """Look up the installed model's digest so cache entries follow model updates"""
+    try:
+        digest = backends.pick().client.model_digest(MODEL_NAME, timeout=(OLLAMA_CONNECT_TIMEOUT, 5))
+    except Exception as e:
+        logger.warning(f"Model digest lookup failed: {e}")
+        digest = None
+    
+    with _model_digest_lock:
+        previous = _model_digest["value"]
+        if digest:
+            _model_digest["value"] = digest
+        _model_digest["checked_at"] = time.monotonic()
+        _model_digest["refreshing"] = False
+    
+    if digest and digest != previous:
+        logger.info(f"Model digest for {MODEL_NAME}: {digest[:19]}")
+        if disk_cache:
+            disk_cache.prune(digest)
+    return digest
+
+
+def current_model_digest():
+    """Last known model digest; refreshes in the background when stale"""
+    with _model_digest_lock:
+        stale = time.monotonic() - _model_digest["checked_at"] > MODEL_DIGEST_REFRESH_SECONDS
+        if stale and not _model_digest["refreshing"]:
+            _model_digest["refreshing"] = True
+            threading.Thread(target=refresh_model_digest, name="model-digest", daemon=True).start()
+        return _model_digest["value"]
+
+
+PROMPT_RULES = '''Rules:
+- Pick ONLY ONE condition (the most prominent)
+- If symptoms are mixed, choose the strongest pattern
+- confidence: 0.0 to 1.0
+- severity: "Mild" or "Moderate" or "Significant"'''
+
+
+def format_symptoms(yes_questions, max_symptoms=MAX_PROMPT_SYMPTOMS):
+    return chr(10).join('- ' + q for q in yes_questions[:max_symptoms])
+
+
+def clean_model_response(model_response):
+    """Strip markdown fences the model sometimes wraps its JSON in"""
+    model_response = model_response.strip()
+    if model_response.startswith("```"):
+        model_response = model_response.split("```")[1]
+    if model_response.startswith("json"):
+        model_response = model_response[4:].strip()
+    return model_response
+
+
+def validate_analysis(analysis, symptom_count):
+    """Turn one parsed JSON verdict into (condition, confidence, severity, reasoning, recommendation)"""
+    condition = analysis.get("condition", "No disorder detected")
+    confidence = float(analysis.get("confidence", 0.5))
+    severity = analysis.get("severity", "Uncertain")
+    
+    # Validate condition is one of our expected values
+    if condition not in VALID_CONDITIONS:
+        # Try to find a valid condition in the response
+        for valid in VALID_CONDITIONS:
+            if valid.lower() in condition.lower():
+                condition = valid
+                break
+        else:
+            # Default to most common if still invalid
+            logger.warning(f"Invalid condition '{condition}', defaulting to No disorder detected")
+            condition = "No disorder detected"
+            confidence = 0.5
+    
+    # Validate severity
+    if severity not in VALID_SEVERITIES:
+        severity = "Moderate"
+    
+    reasoning = f"AI analysis based on {symptom_count} reported symptoms"
+    recommendation = "Professional evaluation recommended if symptoms persist"
+    
+    return condition, confidence, severity, reasoning, recommendation
+
+
+def request_generation(payload, json_start="{", cancel=None, backend=None, exclude=(), deadline=None):
+    """Send one generate request to the least busy backend; raises on transport or HTTP errors.
+
+    With a deadline the Ollama timeouts shrink to the time left, and nothing
+    is sent once it has passed.
+    """
+    timeout = deadline.timeout(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT) if deadline else None
+    
+    with backends.lease(exclude=exclude, backend=backend) as backend:
+        manager = residency[backend.name]
+        if manager.note_request():
+            logger.info(f"{MODEL_NAME} is not loaded on {backend.name}; this request pays the model load")
+        
+        try:
+            if OLLAMA_STREAMING:
+                # Stop generating as soon as the JSON verdict closes
+                result = backend.client.generate_until_json(
+                    payload, timeout=timeout, start=json_start, cancel=cancel, deadline=deadline
+                )
+            else:
+                if cancel is not None:
+                    cancel.check()
+                response = backend.client.generate(payload, timeout=timeout)
+                if response.status_code != 200:
+                    raise OllamaHTTPError(response.status_code)
+                result = response.json()
+        except OVERLOAD_ERRORS:
+            # A timeout cut short by the caller's deadline is not the backend's fault
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded("request deadline exceeded") from None
+            raise
+        
+        manager.record_generation(result)
+        return result
+
+
+def is_parseable_verdict(result):
+    try:
+        json.loads(clean_model_response(result.get("response", "")))
+        return True
+    except ValueError:
         return False
 
 
-def analyze_with_ollama_simple(questions, answers):
-    """Simplified Ollama analysis with shorter prompt"""
+def generate_hedged(payload, json_start, cancel, delay, deadline=None):
+    """Send the generation to a second backend if the first has not answered after delay seconds"""
+    primary = backends.pick()
     
-    # Count yes/no
-    yes_count = sum(1 for a in answers if a == "yes")
+    def attempt(index, token):
+        if index == 0:
+            return request_generation(payload, json_start, token, backend=primary, deadline=deadline)
+        return request_generation(payload, json_start, token, exclude=(primary,), deadline=deadline)
     
-    # Build minimal context (only YES answers to save tokens)
-    yes_questions = [q for q, a in zip(questions, answers) if a == "yes"]
+    result, hedge_won = run_hedged(
+        attempt, delay, hedge_budget, hedge_executor, cancel=cancel, accept=is_parseable_verdict
+    )
+    if hedge_won:
+        logger.info("Hedged generation answered first")
+    return result
+
+
+def generation_payload(prompt, options=None):
+    return {
+        "model": MODEL_NAME,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "options": options or OLLAMA_OPTIONS
+    }
+
+
+def generate_text(prompt, options=None, json_start="{"):
+    """Run one generation and return the model's (cleaned) text"""
+    start_time = time.time()
     
-    if len(yes_questions) == 0:
-        return "No disorder detected", 0.9, "No symptoms", "No symptoms reported", "Keep up the good work!"
+    payload = generation_payload(prompt, options)
+    
+    cancel = current_cancel.get()
+    deadline = current_deadline.get()
+    hedge_delay = None
+    if HEDGING_ENABLED and len(backends.backends) > 1:
+        hedge_delay = generation_latency.percentile(HEDGE_PERCENTILE)
     
-    # Very short prompt
-    prompt = f"""You are a mental health screening assistant. Analyze these symptoms and pick ONE primary condition.
+    # Only backend failures count against the breaker, not unparseable answers
+    if hedge_delay is None:
+        result = breaker.call(request_generation, payload, json_start, cancel, deadline=deadline)
+    else:
+        result = breaker.call(generate_hedged, payload, json_start, cancel, hedge_delay, deadline)
+    
+    elapsed = time.time() - start_time
+    generation_latency.observe(elapsed)
+    if brownout:
+        brownout.observe_latency(elapsed)
+    if result.get("early_stop"):
+        logger.info(f"Ollama responded in {elapsed:.1f} seconds (stopped early after {result['tokens']} tokens)")
+    else:
+        logger.info(f"Ollama responded in {elapsed:.1f} seconds")
+    
+    model_response = clean_model_response(result.get("response", ""))
+    logger.info(f"Raw response: {model_response[:200]}")
+    return model_response
+
+
+def build_prompt(yes_questions, max_symptoms=MAX_PROMPT_SYMPTOMS):
+    """Very short single-questionnaire prompt"""
+    return f"""You are a mental health screening assistant. Analyze these symptoms and pick ONE primary condition.
 
 Reported symptoms:
-{chr(10).join('- ' + q for q in yes_questions[:10])}
+{format_symptoms(yes_questions, max_symptoms)}
 
 Choose the SINGLE MOST LIKELY condition from: Depression, Anxiety, ADHD, PTSD, Aspergers, or "No disorder detected"
 
 Respond ONLY with valid JSON (no markdown, no extra text):
 {{"condition":"Depression","confidence":0.85,"severity":"Moderate"}}
 
-Rules:
-- Pick ONLY ONE condition (the most prominent)
-- If symptoms are mixed, choose the strongest pattern
-- confidence: 0.0 to 1.0
-- severity: "Mild" or "Moderate" or "Significant"
+{PROMPT_RULES}
 
 Your JSON response:"""
 
+
+def parse_verdict(model_response, symptom_count):
+    try:
+        return validate_analysis(json.loads(model_response), symptom_count)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON parse failed: {e}")
+        logger.error(f"Response was: {model_response}")
+        raise
+
+
+def analyze_with_ollama_simple(questions, answers, max_symptoms=MAX_PROMPT_SYMPTOMS, options=None):
+    """Simplified Ollama analysis with shorter prompt"""
+    
+    # Build minimal context (only YES answers to save tokens)
+    yes_questions = [q for q, a in zip(questions, answers) if a == "yes"]
+    
+    if len(yes_questions) == 0:
+        return "No disorder detected", 0.9, "No symptoms", "No symptoms reported", "Keep up the good work!"
+    
     try:
         logger.info(f"Sending to Ollama: {len(yes_questions)} symptoms")
-        start_time = time.time()
-        
-        response = requests.post(
-            OLLAMA_URL,
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.2,
-                    "num_predict": 100,  # Limit response length
-                }
-            },
-            timeout=120  # 2 minutes max
-        )
-        
-        elapsed = time.time() - start_time
-        logger.info(f"Ollama responded in {elapsed:.1f} seconds")
-        
-        if response.status_code == 200:
-            result = response.json()
-            model_response = result.get("response", "")
-            
-            # Clean response
-            model_response = model_response.strip()
-            if model_response.startswith("```"):
-                model_response = model_response.split("```")[1]
-            if model_response.startswith("json"):
-                model_response = model_response[4:].strip()
-            
-            logger.info(f"Raw response: {model_response[:200]}")
-            
-            try:
-                analysis = json.loads(model_response)
-                condition = analysis.get("condition", "No disorder detected")
-                confidence = float(analysis.get("confidence", 0.5))
-                severity = analysis.get("severity", "Uncertain")
-                
-                # Validate condition is one of our expected values
-                valid_conditions = ["Depression", "Anxiety", "ADHD", "PTSD", "Aspergers", "No disorder detected"]
-                if condition not in valid_conditions:
-                    # Try to find a valid condition in the response
-                    for valid in valid_conditions:
-                        if valid.lower() in condition.lower():
-                            condition = valid
-                            break
-                    else:
-                        # Default to most common if still invalid
-                        logger.warning(f"Invalid condition '{condition}', defaulting to No disorder detected")
-                        condition = "No disorder detected"
-                        confidence = 0.5
-                
-                # Validate severity
-                valid_severities = ["Mild", "Moderate", "Significant", "Minimal", "Uncertain"]
-                if severity not in valid_severities:
-                    severity = "Moderate"
-                
-                reasoning = f"AI analysis based on {len(yes_questions)} reported symptoms"
-                recommendation = "Professional evaluation recommended if symptoms persist"
-                
-                return condition, confidence, severity, reasoning, recommendation
-                
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parse failed: {e}")
-                logger.error(f"Response was: {model_response}")
-                raise
-        else:
-            raise Exception(f"Ollama returned {response.status_code}")
-            
+        model_response = generate_text(build_prompt(yes_questions, max_symptoms), options=options)
+        return parse_verdict(model_response, len(yes_questions))
     except Exception as e:
         logger.error(f"Ollama failed: {e}")
         raise
 
 
+def analyze_batch_with_ollama(items, cancel=None, deadline=None):
+    """One generation for several questionnaires, given as (yes_questions, options) items.
+
+    Every item carries the same options (the batcher keys on them). Returns
+    one entry per item: a verdict tuple, or an exception for items the
+    model got wrong so each can fall back on its own.
+    """
+    # Runs on a batcher thread, so hand the batch's cancel token and deadline to generate_text
+    current_cancel.set(cancel)
+    current_deadline.set(deadline)
+    symptom_sets = [yes_questions for yes_questions, _ in items]
+    base_options = items[0][1] or OLLAMA_OPTIONS
+    
+    if len(symptom_sets) == 1:
+        try:
+            return [analyze_with_ollama_simple(symptom_sets[0], ["yes"] * len(symptom_sets[0]), options=base_options)]
+        except Exception as e:
+            return [e]
+    
+    sections = "\n\n".join(
+        f"Questionnaire {i}:\n{format_symptoms(yes_questions)}"
+        for i, yes_questions in enumerate(symptom_sets, start=1)
+    )
+    prompt = f"""You are a mental health screening assistant. For EACH numbered questionnaire below, analyze the symptoms and pick ONE primary condition.
+
+{sections}
+
+For each questionnaire choose the SINGLE MOST LIKELY condition from: Depression, Anxiety, ADHD, PTSD, Aspergers, or "No disorder detected"
+
+Respond ONLY with a valid JSON array, one object per questionnaire in order (no markdown, no extra text):
+[{{"id":1,"condition":"Depression","confidence":0.85,"severity":"Moderate"}},{{"id":2,"condition":"Anxiety","confidence":0.7,"severity":"Mild"}}]
+
+{PROMPT_RULES}
+
+Your JSON response:"""
+
+    options = dict(base_options, num_predict=base_options["num_predict"] * len(symptom_sets))
+    
+    try:
+        logger.info(f"Sending batch to Ollama: {len(symptom_sets)} questionnaires")
+        model_response = generate_text(prompt, options=options, json_start="[")
+        verdicts = json.loads(model_response)
+        if not isinstance(verdicts, list):
+            raise ValueError("Batch response is not a JSON array")
+    except Exception as e:
+        logger.error(f"Ollama batch failed: {e}")
+        return [e] * len(symptom_sets)
+    
+    by_id = {v.get("id"): v for v in verdicts if isinstance(v, dict)}
+    results = []
+    for i, yes_questions in enumerate(symptom_sets, start=1):
+        analysis = by_id.get(i)
+        if analysis is None and len(verdicts) == len(symptom_sets) and isinstance(verdicts[i - 1], dict):
+            analysis = verdicts[i - 1]
+        try:
+            if analysis is None:
+                raise ValueError(f"No verdict for questionnaire {i}")
+            results.append(validate_analysis(analysis, len(yes_questions)))
+        except Exception as e:
+            logger.warning(f"Batch item {i} malformed: {e}")
+            results.append(e)
+    return results
+
+
+batcher = None
+if BATCHING_ENABLED:
+    # One batch in flight per backend, so batching still spreads over the pool
+    batcher = MicroBatcher(
+        analyze_batch_with_ollama, max_items=BATCH_MAX_ITEMS, max_wait_ms=BATCH_MAX_WAIT_MS,
+        workers=len(backends.backends),
+    )
+
+
+def generate_verdict(questions, answers, max_symptoms=MAX_PROMPT_SYMPTOMS, options=None):
+    """Uncached LLM verdict, batched with other pending assessments when enabled"""
+    if batcher is None:
+        return analyze_with_ollama_simple(questions, answers, max_symptoms, options)
+    yes_questions = [q for q, a in zip(questions, answers) if a == "yes"]
+    options = options or OLLAMA_OPTIONS
+    # Only requests generating with the same options (e.g. brownout's shorter num_predict) share a batch
+    return batcher.submit(
+        (yes_questions[:max_symptoms], options), key=json.dumps(options, sort_keys=True),
+        cancel=current_cancel.get(), deadline=current_deadline.get(),
+    )
+
+
+def generate_admitted(questions, answers, max_symptoms=MAX_PROMPT_SYMPTOMS, options=None):
+    """generate_verdict once the admission queue lets this request through"""
+    tenant, priority = current_tenant.get()
+    deadline = current_deadline.get()
+    with admission.slot(tenant, priority, timeout=deadline.remaining() if deadline else None):
+        return generate_verdict(questions, answers, max_symptoms, options)
+
+
+def resolve_tenant(headers):
+    """(tenant, priority) from the request headers; new tenants past the tracking cap share 'other'.
+
+    The priority header can lower a tenant's configured priority (TENANT_DEFAULT_PRIORITY when
+    unlisted) but never raise it.
+    """
+    tenant = (headers.get(TENANT_HEADER) or DEFAULT_TENANT).strip()[:64] or DEFAULT_TENANT
+    with _seen_tenants_lock:
+        if tenant not in _seen_tenants:
+            if len(_seen_tenants) >= MAX_TRACKED_TENANTS:
+                tenant = "other"
+            _seen_tenants.add(tenant)
+    
+    # The configured priority is a ceiling: the header can only ask to go further back
+    ceiling = PRIORITIES.get(TENANT_PRIORITIES.get(tenant, TENANT_DEFAULT_PRIORITY).lower(), PRIORITIES["batch"])
+    requested = PRIORITIES.get((headers.get(PRIORITY_HEADER) or "").strip().lower(), ceiling)
+    return tenant, max(ceiling, requested)
+
+
+def lookup_cached(key, digest):
+    """Memory, then disk (promoting hits into memory); None on a miss"""
+    cached = result_cache.get(key)
+    if cached is not None:
+        logger.info(f"Cache hit: {key[:12]}")
+        return cached
+    
+    if disk_cache and digest:
+        cached = disk_cache.get(key)
+        if cached is not None:
+            logger.info(f"Disk cache hit: {key[:12]}")
+            result_cache.put(key, cached)
+            return cached
+    return None
+
+
+def analyze_with_cache(questions, answers, reduced=False, bulkhead=llm_bulkhead):
+    """Cached front for analyze_with_ollama_simple; returns (result, cached).
+
+    With reduced=True (brownout) a full-quality cached verdict is still
+    preferred, but a new generation uses the shorter prompt and output
+    limit and is cached under its own key. The wait for a generation runs
+    inside bulkhead; pass None when the caller already holds it.
+    """
+    yes_questions = [q for q, a in zip(questions, answers) if a == "yes"]
+    if len(yes_questions) == 0:
+        return analyze_with_ollama_simple(questions, answers), False
+    
+    # Disk entries are only trusted once the model digest is known
+    digest = current_model_digest()
+    model_id = f"{MODEL_NAME}@{digest}" if digest else MODEL_NAME
+    
+    max_symptoms, options = MAX_PROMPT_SYMPTOMS, OLLAMA_OPTIONS
+    keys = [symptom_cache_key(yes_questions[:max_symptoms], model_id, PROMPT_VERSION, options)]
+    if reduced:
+        max_symptoms = BROWNOUT_MAX_SYMPTOMS
+        options = dict(OLLAMA_OPTIONS, num_predict=BROWNOUT_NUM_PREDICT)
+        keys.append(symptom_cache_key(yes_questions[:max_symptoms], model_id, PROMPT_VERSION, options))
+    
+    for key in keys:
+        cached = lookup_cached(key, digest)
+        if cached is not None:
+            return cached, True
+    
+    if breaker.is_open():
+        raise CircuitOpenError("Ollama circuit is open")
+    
+    key = keys[-1]
+    
+    def generate_and_cache(cancel, deadline):
+        # Runs for every caller sharing it, so it gets the shared call's token and deadline
+        # instead of the first caller's; cached here since that caller may stop waiting first
+        current_cancel.set(cancel)
+        current_deadline.set(deadline)
+        result = generate_admitted(questions, answers, max_symptoms, options)
+        result_cache.put(key, result)
+        if disk_cache and digest:
+            disk_cache.put(key, digest, result)
+        return result
+    
+    # The request thread waits on its cancel token rather than the Ollama socket,
+    # so a drain cut-over or disconnect frees it even before Ollama sends headers
+    with bulkhead.guard() if bulkhead else contextlib.nullcontext():
+        result, shared = inflight.do(key, generate_and_cache, cancel=current_cancel.get(), deadline=current_deadline.get())
+    if shared:
+        logger.info(f"Coalesced with in-flight generation: {key[:12]}")
+    return result, False
+
+
 def fallback_keyword_analysis(questions, answers):
     """Quick keyword-based analysis"""
     yes_count = sum(1 for a in answers if a == "yes")
@@ -183,6 +833,220 @@ def fallback_keyword_analysis(questions, answers):
     return top_condition, confidence, severity, f"{top_score} indicators", "Professional consultation recommended"
 
 
+def keyword_verdict(questions, answers):
+    """fallback_keyword_analysis inside the light-work bulkhead"""
+    with light_bulkhead.guard():
+        return fallback_keyword_analysis(questions, answers)
+
+
+def llm_method(cached, reduced):
+    if cached:
+        return "ollama-ai-cached"
+    return "ollama-ai-reduced" if reduced else "ollama-ai"
+
+
+def assess(questions, answers, reduced=False):
+    """Try Ollama, fallback to keywords; returns (result, method)"""
+    try:
+        logger.info("Trying Ollama...")
+        result, cached = analyze_with_cache(questions, answers, reduced)
+        logger.info(f"✅ Ollama success: {result[0]}")
+        return result, llm_method(cached, reduced)
+    except AdmissionRejected as e:
+        if e.reason == DRAIN_REASON:
+            return keyword_verdict(questions, answers), "keyword-drain"
+        if ADMISSION_OVERFLOW == "reject":
+            raise
+        logger.warning(f"⚠️  LLM queue overloaded ({e.reason}), using keywords")
+        return keyword_verdict(questions, answers), "keyword-overload"
+    except BulkheadFull:
+        logger.warning("⚠️  LLM bulkhead full, using keywords")
+        return keyword_verdict(questions, answers), "keyword-bulkhead"
+    except DeadlineExceeded:
+        logger.warning("⚠️  Request deadline passed during generation, using keywords")
+        return keyword_verdict(questions, answers), "keyword-deadline"
+    except GenerationCancelled as e:
+        logger.info(f"Generation cancelled: {e}")
+        return keyword_verdict(questions, answers), "keyword-drain" if str(e) == DRAIN_REASON else "keyword-cancelled"
+    except Exception as e:
+        logger.warning(f"⚠️  Ollama failed, using keywords: {e}")
+        return keyword_verdict(questions, answers), "keyword-fallback"
+
+
+def assess_within_budget(questions, answers, budget, reduced=False):
+    """Keyword verdict up front, LLM verdict only if it arrives within budget seconds"""
+    keyword_result = keyword_verdict(questions, answers)
+    
+    cancel = CancelToken()
+    parent = current_cancel.get()
+    if parent is not None:
+        parent.link(cancel)
+    ctx = contextvars.copy_context()
+    ctx.run(current_cancel.set, cancel)
+    
+    try:
+        # This thread blocks for up to budget seconds, so it is what the LLM bulkhead counts
+        with llm_bulkhead.guard():
+            llm_pool_bulkhead.enter()
+            future = llm_executor.submit(ctx.run, analyze_with_cache, questions, answers, reduced, None)
+            future.add_done_callback(lambda _: llm_pool_bulkhead.leave())
+            result, cached = future.result(timeout=budget)
+        logger.info(f"✅ Ollama success within budget: {result[0]}")
+        return result, llm_method(cached, reduced)
+    except FutureTimeout:
+        if LLM_BUDGET_OVERRUN == "cancel":
+            future.cancel()
+            cancel.cancel("latency budget exceeded")
+            logger.warning(f"⚠️  Ollama over {budget}s budget, cancelled; using keywords")
+        else:
+            logger.warning(f"⚠️  Ollama over {budget}s budget, using keywords (LLM result will warm the cache)")
+        return keyword_result, "keyword-budget"
+    except AdmissionRejected as e:
+        if e.reason == DRAIN_REASON:
+            return keyword_result, "keyword-drain"
+        if ADMISSION_OVERFLOW == "reject":
+            raise
+        logger.warning(f"⚠️  LLM queue overloaded ({e.reason}), using keywords")
+        return keyword_result, "keyword-overload"
+    except BulkheadFull as e:
+        logger.warning(f"⚠️  {e}, using keywords")
+        return keyword_result, "keyword-bulkhead"
+    except GenerationCancelled as e:
+        logger.info(f"Generation cancelled: {e}")
+        return keyword_result, "keyword-drain" if str(e) == DRAIN_REASON else "keyword-cancelled"
+    except Exception as e:
+        logger.warning(f"⚠️  Ollama failed, using keywords: {e}")
+        return keyword_result, "keyword-fallback"
+
+
+def serve_assessment(questions, answers):
+    """Pick how to serve an assessment given the brownout level; returns (result, method)"""
+    level = brownout.update(admission.queue_utilisation()) if brownout else FULL
+    
+    if level >= KEYWORDS:
+        return keyword_verdict(questions, answers), "keyword-brownout"
+    
+    if level == AMBIGUOUS:
+        keyword_result = keyword_verdict(questions, answers)
+        if keyword_result[1] >= BROWNOUT_KEYWORD_CONFIDENCE:
+            return keyword_result, "keyword-brownout"
+    
+    # The LLM only gets what is left of the caller's deadline, if that is enough to bother
+    budget = LLM_LATENCY_BUDGET_SECONDS
+    deadline = current_deadline.get()
+    if deadline is not None:
+        remaining = deadline.remaining() - DEADLINE_RESPONSE_MARGIN_SECONDS
+        if remaining < DEADLINE_MIN_LLM_SECONDS:
+            return keyword_verdict(questions, answers), "keyword-deadline"
+        if budget > 0:
+            budget = min(budget, remaining)
+    
+    reduced = level >= REDUCED
+    if budget > 0:
+        return assess_within_budget(questions, answers, budget, reduced)
+    # A deadline alone already caps the admission wait and the Ollama timeouts, so the
+    # request stays on its own thread and goes through the admission queue like any other.
+    # The LLM stops short of it to leave time for the keyword answer.
+    if deadline is not None:
+        current_deadline.set(Deadline(deadline.expires_at - DEADLINE_RESPONSE_MARGIN_SECONDS))
+    return assess(questions, answers, reduced)
+
+
+NO_SYMPTOMS_RESPONSE = {
+    "verdict": "You're doing well! No significant concerns detected.",
+    "labels": ["No disorder detected"],
+    "severity": "No symptoms",
+    "confidence": 1.0,
+    "method": "direct"
+}
+
+
+def verdict_response(result, method):
+    """/predict response body for a (condition, confidence, severity, reasoning, recommendation) result"""
+    condition, confidence, severity, reasoning, recommendation = result
+    
+    # Build verdict
+    if condition == "No disorder detected":
+        verdict = f"You seem to be doing well! {recommendation}"
+    else:
+        verdict = f"{severity} symptoms detected. You may be experiencing {condition}. {recommendation}"
+
+    return {
+        "verdict": verdict,
+        "labels": [condition],
+        "severity": severity,
+        "confidence": round(confidence, 2),
+        "reasoning": reasoning,
+        "method": method
+    }
+
+
+def health_status():
+    probe = ollama_prober.snapshot()
+    return {
+        "status": "healthy",
+        "ollama_status": "connected" if probe["ok"] else "timeout/not available",
+        "model": MODEL_NAME,
+        "circuit_breaker": breaker.state,
+        "brownout_level": brownout.level if brownout else FULL,
+        "last_probe_age_seconds": probe["last_probe_age_seconds"],
+        "last_probe_latency_ms": probe["last_probe_latency_ms"],
+        "fallback": "keyword analysis available"
+    }
+
+
+def readiness_status():
+    """(body, ready) for the readiness probe; a draining server is never ready"""
+    ollama_ok = ollama_prober.ok
+    if drainer.draining:
+        return {"status": "draining", "ollama_status": "connected" if ollama_ok else "timeout/not available"}, False
+    
+    ready = ollama_ok or not READY_REQUIRES_OLLAMA
+    return {
+        "status": "ready" if ready else "not ready",
+        "ollama_status": "connected" if ollama_ok else "timeout/not available"
+    }, ready
+
+
+def bulkheaded(bulkhead):
+    """Run a route inside bulkhead; answers 503 when it is full"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                with bulkhead.guard():
+                    return fn(*args, **kwargs)
+            except BulkheadFull as e:
+                return jsonify({"error": str(e)}), 503
+        return wrapper
+    return decorator
+
+
+def admin_authorized(headers):
+    """True if X-Admin-Token matches ADMIN_TOKEN; always False while no token is configured"""
+    token = headers.get("X-Admin-Token") or ""
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+
+
+def flush_caches():
+    """Empty the memory and disk verdict caches; returns the admin endpoint's response body"""
+    flushed = result_cache.clear()
+    disk_flushed = disk_cache.clear() if disk_cache else None
+    logger.info(f"Cache flushed: {flushed} entries in memory, {disk_flushed} on disk")
+    return {
+        "flushed": flushed,
+        "disk_flushed": disk_flushed,
+        "cache": result_cache.stats(),
+        "disk_cache": disk_cache.stats() if disk_cache else None,
+    }
+
+
+@app.before_request
+def ensure_background_started():
+    # Servers that do not call mark_bound (another WSGI server importing app) start it here
+    start_background()
+
+
 @app.route("/predict", methods=["POST"])
 def predict():
     try:
@@ -191,42 +1055,48 @@ def predict():
         questions = data.get("questions", [])
         noSymptoms = data.get("noSymptoms", False)
 
-        logger.info(f"Assessment: {len(questions)} questions")
+        tenant, priority = resolve_tenant(request.headers)
+        current_tenant.set((tenant, priority))
+        
+        deadline = deadline_from_headers(request.headers, DEADLINE_HEADER, TIMEOUT_HEADER, DEADLINE_MAX_SECONDS)
+        current_deadline.set(deadline)
+        if deadline is not None and deadline.expired():
+            logger.warning("⚠️  Request arrived after its deadline, skipping")
+            return jsonify({"error": "Request deadline already passed"}), 504
+        
+        cancel = CancelToken()
+        current_cancel.set(cancel)
+
+        logger.info(f"Assessment: {len(questions)} questions (tenant {tenant})")
 
         if noSymptoms:
-            return jsonify({
-                "verdict": "You're doing well! No significant concerns detected.",
-                "labels": ["No disorder detected"],
-                "severity": "No symptoms",
-                "confidence": 1.0,
-                "method": "direct"
-            })
-
-        # Try Ollama, fallback to keywords
-        try:
-            logger.info("Trying Ollama...")
-            condition, confidence, severity, reasoning, recommendation = analyze_with_ollama_simple(questions, answers)
-            method = "ollama-ai"
-            logger.info(f"✅ Ollama success: {condition}")
-        except Exception as e:
-            logger.warning(f"⚠️  Ollama failed, using keywords: {e}")
-            condition, confidence, severity, reasoning, recommendation = fallback_keyword_analysis(questions, answers)
-            method = "keyword-fallback"
+            with light_bulkhead.guard():
+                return jsonify(NO_SYMPTOMS_RESPONSE)
+
+        with drainer.track(cancel):
+            if drainer.draining:
+                # Accepted while shutting down: answer, but start no new LLM work
+                return jsonify(verdict_response(keyword_verdict(questions, answers), "keyword-drain"))
+            
+            # The request body has been read, so the socket only turns readable again on hang-up
+            sock = client_socket(request.environ) if CANCEL_ON_DISCONNECT else None
+            with disconnect_watcher.watch(sock, cancel):
+                result, method = serve_assessment(questions, answers)
+        if cancel.reason == DISCONNECT_REASON:
+            return jsonify({"error": "Client disconnected"}), 499
         
-        # Build verdict
-        if condition == "No disorder detected":
-            verdict = f"You seem to be doing well! {recommendation}"
-        else:
-            verdict = f"{severity} symptoms detected. You may be experiencing {condition}. {recommendation}"
-
-        return jsonify({
-            "verdict": verdict,
-            "labels": [condition],
-            "severity": severity,
-            "confidence": round(confidence, 2),
-            "reasoning": reasoning,
-            "method": method
-        })
+        return jsonify(verdict_response(result, method))
+    
+    except AdmissionRejected as e:
+        logger.warning(f"⚠️  Rejecting assessment: {e.reason}")
+        return jsonify({"error": "Server busy, please retry", "reason": e.reason}), 429, {"Retry-After": str(e.retry_after)}
+    
+    except BulkheadFull as e:
+        logger.warning(f"⚠️  Rejecting assessment: {e}")
+        return jsonify({"error": "Server busy, please retry", "reason": "bulkhead_full"}), 503, {"Retry-After": "1"}
+    
+    except RequestEntityTooLarge:
+        return jsonify({"error": f"Request body over {MAX_REQUEST_BYTES} bytes"}), 413
         
     except Exception as e:
         logger.error(f"Error: {e}", exc_info=True)
@@ -234,29 +1104,137 @@ def predict():
 
 
 @app.route("/health", methods=["GET"])
+@bulkheaded(ops_bulkhead)
 def health_check():
-    ollama_ok = test_ollama_connection()
-    
+    return jsonify(health_status())
+
+
+# Never bulkheaded: a rejected liveness probe would get a busy but healthy process restarted
+@app.route("/health/live", methods=["GET"])
+def liveness():
+    return jsonify({"status": "alive"})
+
+
+@app.route("/health/ready", methods=["GET"])
+@bulkheaded(ops_bulkhead)
+def readiness():
+    body, ready = readiness_status()
+    return jsonify(body), 200 if ready else 503
+
+
+@app.route("/metrics", methods=["GET"])
+@bulkheaded(ops_bulkhead)
+def metrics():
     return jsonify({
-        "status": "healthy",
-        "ollama_status": "connected" if ollama_ok else "timeout/not available",
-        "model": MODEL_NAME,
-        "fallback": "keyword analysis available"
+        "cache": result_cache.stats(),
+        "disk_cache": disk_cache.stats() if disk_cache else None,
+        "single_flight": inflight.stats(),
+        "batching": batcher.stats() if batcher else None,
+        "circuit_breaker": breaker.stats(),
+        "ollama_probe": ollama_prober.snapshot(),
+        "model_residency": [manager.stats() for manager in residency.values()],
+        "backends": backends.stats(),
+        "admission": admission.stats(),
+        "brownout": brownout.stats() if brownout else None,
+        "bulkheads": {b.name: b.stats() for b in (llm_bulkhead, llm_pool_bulkhead, light_bulkhead, ops_bulkhead)},
+        "disconnects": dict(disconnect_watcher.stats(), enabled=CANCEL_ON_DISCONNECT),
+        "drain": drainer.stats(),
+        "startup": startup.stats(),
+        "hedging": dict(
+            hedge_budget.stats(),
+            enabled=HEDGING_ENABLED,
+            hedge_delay_seconds=generation_latency.percentile(HEDGE_PERCENTILE)
+        )
     })
 
 
+@app.route("/admin/cache/flush", methods=["POST"])
+@bulkheaded(ops_bulkhead)
+def flush_cache():
+    if not admin_authorized(request.headers):
+        return jsonify({"error": "forbidden"}), 403
+    
+    return jsonify(flush_caches())
+
+
+def run_dev_server(host, port, unix_socket=""):
+    """Flask's threaded development server, speaking HTTP/1.1 so the gateway can keep connections open"""
+    import _thread
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    
+    old_umask = None
+    if unix_socket:
+        # The dev server has a single listener, so the socket replaces TCP
+        import serve
+        serve.remove_stale_socket(unix_socket)
+        old_umask = os.umask(0o777 & ~serve.UNIX_SOCKET_MODE)
+        host = f"unix://{unix_socket}"
+        logger.info(f"Listening on {host} instead of TCP")
+    
+    # SIGTERM drains in-flight requests, then stops the server
+    def stop_after_drain():
+        if drainer.draining:
+            _thread.interrupt_main()
+    
+    install_drain_handler(drainer)
+    drainer.on_finish(stop_after_drain)
+    
+    # Bind first; the Ollama probe and model warm-up then run in the background.
+    # No reloader: it would start a second process and run every startup step twice.
+    app.debug = FLASK_DEBUG
+    try:
+        server = make_server(host, port, app, threaded=True)
+    finally:
+        if old_umask is not None:
+            os.umask(old_umask)
+    if not unix_socket:
+        logger.info(f"Listening on http://{host}:{port}")
+    mark_bound()
+    logger.info("="*60)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+startup.mark("imported")
+
+
 if __name__ == "__main__":
+    import argparse
+    import importlib.util
+    
+    parser = argparse.ArgumentParser(description="Ollama mental health server")
+    parser.add_argument("--server", choices=["production", "dev"], default=SERVER_MODE)
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "5000")))
+    parser.add_argument("--workers", type=int, help="gunicorn worker processes (production)")
+    parser.add_argument("--threads", type=int, help="threads per gunicorn worker (production)")
+    parser.add_argument("--unix-socket", default=os.environ.get("UNIX_SOCKET_PATH", ""),
+                        help="Unix domain socket path (alongside TCP in production, instead of it in dev)")
+    args = parser.parse_args()
+    
     logger.info("="*60)
     logger.info("SIMPLIFIED OLLAMA MENTAL HEALTH SERVER")
     logger.info("="*60)
     logger.info(f"Model: {MODEL_NAME}")
-    logger.info("Testing Ollama connection...")
     
-    if test_ollama_connection():
-        logger.info("✅ Ollama is responding")
-    else:
-        logger.warning("⚠️  Ollama is slow/unavailable - will use keyword fallback")
+    if args.server == "production" and importlib.util.find_spec("gunicorn") is None:
+        # gunicorn is optional; a plain `python ml_server.py` should still come up
+        logger.warning("⚠️  gunicorn is not installed (pip install gunicorn), falling back to the dev server")
+        args.server = "dev"
     
-    logger.info("="*60)
-    
-    app.run(port=5000, debug=True, host='0.0.0.0')
+    if args.server == "dev":
+        run_dev_server(args.host, args.port, args.unix_socket)
+    else:
+        import serve
+        logger.info("="*60)
+        serve.run(
+            f"{args.host}:{args.port}",
+            workers=args.workers or serve.WEB_WORKERS,
+            threads=args.threads or serve.WEB_THREADS,
+            unix_socket=args.unix_socket,
+        )
@@ -0,0 +1,438 @@
+"""
+Async Ollama Mental Health Server
+ASGI variant of ml_server: same routes, responses and fallbacks, with Ollama calls as coroutines
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+import signal
+import time
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+import ml_server as core
+import serve
+from admission import AdmissionRejected, AsyncAdmissionController
+from async_ollama_client import ASYNC_OVERLOAD_ERRORS, AsyncOllamaClient
+from brownout import AMBIGUOUS, FULL, KEYWORDS, REDUCED
+from circuit_breaker import CircuitOpenError
+from deadline import Deadline, DeadlineExceeded, deadline_from_headers
+from disconnect import DISCONNECT_REASON
+from drain import DRAIN_REASON
+from ollama_client import CancelToken, GenerationCancelled
+from result_cache import symptom_cache_key
+from singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Coroutines waiting on Ollama are cheap, so the admission queue can be much deeper than in the threaded server
+ASGI_MAX_QUEUE = int(os.environ.get("ASGI_MAX_QUEUE", "1000"))
+
+# One async client per Ollama backend, opened with the event loop
+ollama_clients = {}
+inflight = AsyncSingleFlight()
+admission = AsyncAdmissionController(
+    limit=core.ADMISSION_MAX_CONCURRENCY,
+    max_queue=ASGI_MAX_QUEUE,
+    max_wait=core.ADMISSION_MAX_WAIT_SECONDS,
+)
+disconnects = {"disconnects": 0}
+
+# LLM generations left running past their latency budget to warm the cache
+_background = set()
+
+
+async def request_generation(payload, deadline=None):
+    """Async ml_server.request_generation: one generate request to the least busy backend"""
+    timeout = deadline.timeout(core.OLLAMA_CONNECT_TIMEOUT, core.OLLAMA_READ_TIMEOUT) if deadline else None
+
+    with core.backends.lease() as backend:
+        manager = core.residency[backend.name]
+        if manager.note_request():
+            logger.info(f"{core.MODEL_NAME} is not loaded on {backend.name}; this request pays the model load")
+
+        client = ollama_clients[backend.name]
+        try:
+            if core.OLLAMA_STREAMING:
+                result = await client.generate_until_json(payload, timeout=timeout, deadline=deadline)
+            else:
+                result = await client.generate(payload, timeout=timeout)
+        except ASYNC_OVERLOAD_ERRORS:
+            if deadline is not None and deadline.expired():
+                raise DeadlineExceeded("request deadline exceeded") from None
+            raise
+
+        manager.record_generation(result)
+        return result
+
+
+async def breaker_call(fn, *args):
+    """CircuitBreaker.call for a coroutine function; cancellation counts as neither success nor failure"""
+    breaker = core.breaker
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+    try:
+        result = await fn(*args)
+    except (asyncio.CancelledError, *breaker.ignore):
+        breaker.release()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+async def generate_text(prompt, options, deadline):
+    start_time = time.time()
+    result = await breaker_call(request_generation, core.generation_payload(prompt, options), deadline)
+
+    elapsed = time.time() - start_time
+    core.generation_latency.observe(elapsed)
+    if core.brownout:
+        core.brownout.observe_latency(elapsed)
+    logger.info(f"Ollama responded in {elapsed:.1f} seconds")
+    return core.clean_model_response(result.get("response", ""))
+
+
+async def generate_admitted(yes_questions, max_symptoms, options, deadline):
+    async with admission.slot(timeout=deadline.remaining() if deadline else None):
+        logger.info(f"Sending to Ollama: {len(yes_questions)} symptoms")
+        model_response = await generate_text(core.build_prompt(yes_questions, max_symptoms), options, deadline)
+        return core.parse_verdict(model_response, len(yes_questions))
+
+
+async def lookup_cached(key, digest):
+    """ml_server.lookup_cached with the SQLite read moved off the event loop"""
+    cached = core.result_cache.get(key)
+    if cached is not None:
+        logger.info(f"Cache hit: {key[:12]}")
+        return cached
+
+    if core.disk_cache and digest:
+        cached = await asyncio.to_thread(core.disk_cache.get, key)
+        if cached is not None:
+            logger.info(f"Disk cache hit: {key[:12]}")
+            core.result_cache.put(key, cached)
+            return cached
+    return None
+
+
+async def analyze_with_cache(questions, answers, reduced, deadline):
+    """Async ml_server.analyze_with_cache; returns (result, cached)"""
+    yes_questions = [q for q, a in zip(questions, answers) if a == "yes"]
+    if len(yes_questions) == 0:
+        return ("No disorder detected", 0.9, "No symptoms", "No symptoms reported", "Keep up the good work!"), False
+
+    digest = core.current_model_digest()
+    model_id = f"{core.MODEL_NAME}@{digest}" if digest else core.MODEL_NAME
+
+    max_symptoms, options = core.MAX_PROMPT_SYMPTOMS, core.OLLAMA_OPTIONS
+    keys = [symptom_cache_key(yes_questions[:max_symptoms], model_id, core.PROMPT_VERSION, options)]
+    if reduced:
+        max_symptoms = core.BROWNOUT_MAX_SYMPTOMS
+        options = dict(core.OLLAMA_OPTIONS, num_predict=core.BROWNOUT_NUM_PREDICT)
+        keys.append(symptom_cache_key(yes_questions[:max_symptoms], model_id, core.PROMPT_VERSION, options))
+
+    for key in keys:
+        cached = await lookup_cached(key, digest)
+        if cached is not None:
+            return cached, True
+
+    if core.breaker.is_open():
+        raise CircuitOpenError("Ollama circuit is open")
+
+    key = keys[-1]
+
+    async def generate_and_cache(shared_deadline):
+        # The shared deadline, not the first caller's, so a short one cannot fail the others
+        result = await generate_admitted(yes_questions, max_symptoms, options, shared_deadline)
+        core.result_cache.put(key, result)
+        if core.disk_cache and digest:
+            core.disk_cache.put(key, digest, result)
+        return result
+
+    result, shared = await inflight.do(key, generate_and_cache, deadline)
+    if shared:
+        logger.info(f"Coalesced with in-flight generation: {key[:12]}")
+    return result, False
+
+
+def keyword_fallback(questions, answers, error):
+    """The keyword verdict and method ml_server.assess would fall back to for error"""
+    if isinstance(error, AdmissionRejected):
+        if core.ADMISSION_OVERFLOW == "reject":
+            raise error
+        logger.warning(f"⚠️  LLM queue overloaded ({error.reason}), using keywords")
+        method = "keyword-overload"
+    elif isinstance(error, DeadlineExceeded):
+        logger.warning("⚠️  Request deadline passed during generation, using keywords")
+        method = "keyword-deadline"
+    elif isinstance(error, GenerationCancelled):
+        logger.info(f"Generation cancelled: {error}")
+        method = "keyword-cancelled"
+    else:
+        logger.warning(f"⚠️  Ollama failed, using keywords: {error}")
+        method = "keyword-fallback"
+    return core.fallback_keyword_analysis(questions, answers), method
+
+
+async def assess(questions, answers, reduced, deadline):
+    try:
+        logger.info("Trying Ollama...")
+        result, cached = await analyze_with_cache(questions, answers, reduced, deadline)
+        logger.info(f"✅ Ollama success: {result[0]}")
+        return result, core.llm_method(cached, reduced)
+    except Exception as e:
+        return keyword_fallback(questions, answers, e)
+
+
+def _finish_in_background(task):
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    # Nobody awaits the task any more; read its exception so asyncio does not log it
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def assess_within_budget(questions, answers, budget, reduced, deadline):
+    keyword_result = core.fallback_keyword_analysis(questions, answers)
+    task = asyncio.ensure_future(analyze_with_cache(questions, answers, reduced, deadline))
+
+    try:
+        result, cached = await asyncio.wait_for(asyncio.shield(task), budget)
+        logger.info(f"✅ Ollama success within budget: {result[0]}")
+        return result, core.llm_method(cached, reduced)
+    except asyncio.TimeoutError:
+        if core.LLM_BUDGET_OVERRUN == "cancel":
+            task.cancel()
+            logger.warning(f"⚠️  Ollama over {budget}s budget, cancelled; using keywords")
+        else:
+            _finish_in_background(task)
+            logger.warning(f"⚠️  Ollama over {budget}s budget, using keywords (LLM result will warm the cache)")
+        return keyword_result, "keyword-budget"
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    except Exception as e:
+        return keyword_fallback(questions, answers, e)
+
+
+async def serve_assessment(questions, answers, deadline):
+    """Async ml_server.serve_assessment"""
+    brownout = core.brownout
+    level = brownout.update(admission.queue_utilisation()) if brownout else FULL
+
+    if level >= KEYWORDS:
+        return core.fallback_keyword_analysis(questions, answers), "keyword-brownout"
+
+    if level == AMBIGUOUS:
+        keyword_result = core.fallback_keyword_analysis(questions, answers)
+        if keyword_result[1] >= core.BROWNOUT_KEYWORD_CONFIDENCE:
+            return keyword_result, "keyword-brownout"
+
+    budget = core.LLM_LATENCY_BUDGET_SECONDS
+    if deadline is not None:
+        remaining = deadline.remaining() - core.DEADLINE_RESPONSE_MARGIN_SECONDS
+        if remaining < core.DEADLINE_MIN_LLM_SECONDS:
+            return core.fallback_keyword_analysis(questions, answers), "keyword-deadline"
+        if budget > 0:
+            budget = min(budget, remaining)
+
+    reduced = level >= REDUCED
+    if budget > 0:
+        return await assess_within_budget(questions, answers, budget, reduced, deadline)
+    # A deadline alone already caps the admission wait and the Ollama timeouts;
+    # the LLM stops short of it to leave time for the keyword answer
+    if deadline is not None:
+        deadline = Deadline(deadline.expires_at - core.DEADLINE_RESPONSE_MARGIN_SECONDS)
+    return await assess(questions, answers, reduced, deadline)
+
+
+async def supervise(request, coro, token):
+    """Run coro, cancelling it if the client goes away or the drain cuts over first.
+
+    Returns (result, None), or (None, reason) with DISCONNECT_REASON or DRAIN_REASON.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=core.DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result(), None
+            if token.cancelled:
+                task.cancel()
+                return None, token.reason
+            if core.CANCEL_ON_DISCONNECT and await request.is_disconnected():
+                task.cancel()
+                disconnects["disconnects"] += 1
+                logger.info("Client disconnected, cancelling its generation")
+                return None, DISCONNECT_REASON
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+
+async def predict(request):
+    try:
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > core.MAX_REQUEST_BYTES:
+            return JSONResponse({"error": f"Request body over {core.MAX_REQUEST_BYTES} bytes"}, 413)
+
+        data = await request.json()
+        answers = data.get("answers", [])
+        questions = data.get("questions", [])
+        noSymptoms = data.get("noSymptoms", False)
+
+        tenant, _ = core.resolve_tenant(request.headers)
+        deadline = deadline_from_headers(
+            request.headers, core.DEADLINE_HEADER, core.TIMEOUT_HEADER, core.DEADLINE_MAX_SECONDS
+        )
+        if deadline is not None and deadline.expired():
+            logger.warning("⚠️  Request arrived after its deadline, skipping")
+            return JSONResponse({"error": "Request deadline already passed"}, 504)
+
+        logger.info(f"Assessment: {len(questions)} questions (tenant {tenant})")
+
+        if noSymptoms:
+            return JSONResponse(core.NO_SYMPTOMS_RESPONSE)
+
+        token = CancelToken()
+        with core.drainer.track(token):
+            if core.drainer.draining:
+                outcome, interrupted = None, DRAIN_REASON
+            else:
+                outcome, interrupted = await supervise(request, serve_assessment(questions, answers, deadline), token)
+
+        if interrupted == DISCONNECT_REASON:
+            return JSONResponse({"error": "Client disconnected"}, 499)
+        if interrupted is not None:
+            outcome = core.fallback_keyword_analysis(questions, answers), "keyword-drain"
+
+        result, method = outcome
+        return JSONResponse(core.verdict_response(result, method))
+
+    except AdmissionRejected as e:
+        logger.warning(f"⚠️  Rejecting assessment: {e.reason}")
+        return JSONResponse(
+            {"error": "Server busy, please retry", "reason": e.reason}, 429, {"Retry-After": str(e.retry_after)}
+        )
+
+    except Exception as e:
+        logger.error(f"Error: {e}", exc_info=True)
+        return JSONResponse({"error": str(e)}, 500)
+
+
+async def health_check(request):
+    return JSONResponse(core.health_status())
+
+
+async def liveness(request):
+    return JSONResponse({"status": "alive"})
+
+
+async def readiness(request):
+    body, ready = core.readiness_status()
+    return JSONResponse(body, 200 if ready else 503)
+
+
+async def metrics(request):
+    return JSONResponse({
+        "cache": core.result_cache.stats(),
+        "disk_cache": core.disk_cache.stats() if core.disk_cache else None,
+        "single_flight": inflight.stats(),
+        "circuit_breaker": core.breaker.stats(),
+        "ollama_probe": core.ollama_prober.snapshot(),
+        "model_residency": [manager.stats() for manager in core.residency.values()],
+        "backends": core.backends.stats(),
+        "admission": admission.stats(),
+        "brownout": core.brownout.stats() if core.brownout else None,
+        "disconnects": dict(disconnects, enabled=core.CANCEL_ON_DISCONNECT),
+        "drain": core.drainer.stats(),
+        "startup": core.startup.stats(),
+        "background_generations": len(_background),
+    })
+
+
+async def flush_cache(request):
+    if not core.admin_authorized(request.headers):
+        return JSONResponse({"error": "forbidden"}, 403)
+
+    # Waits for the disk cache's writer thread, so keep it off the event loop
+    return JSONResponse(await asyncio.to_thread(core.flush_caches))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    for backend in core.backends.backends:
+        ollama_clients[backend.name] = AsyncOllamaClient(
+            backend.name,
+            pool_size=core.OLLAMA_POOL_SIZE,
+            connect_timeout=core.OLLAMA_CONNECT_TIMEOUT,
+            read_timeout=core.OLLAMA_READ_TIMEOUT,
+        )
+    # uvicorn starts accepting on the already-bound sockets once startup returns
+    core.mark_bound()
+    try:
+        yield
+    finally:
+        for client in ollama_clients.values():
+            await client.aclose()
+        ollama_clients.clear()
+
+
+app = Starlette(
+    routes=[
+        Route("/predict", predict, methods=["POST"]),
+        Route("/health", health_check, methods=["GET"]),
+        Route("/health/live", liveness, methods=["GET"]),
+        Route("/health/ready", readiness, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/admin/cache/flush", flush_cache, methods=["POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+
+def run(host=serve.HOST, port=serve.PORT, unix_socket=serve.UNIX_SOCKET_PATH, listen_tcp=serve.LISTEN_TCP):
+    """Serve the app with uvicorn in this process, on TCP and/or a Unix domain socket"""
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("uvicorn is not installed: pip install uvicorn")
+
+    config = uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        timeout_keep_alive=serve.WEB_KEEPALIVE_SECONDS,
+        backlog=serve.WEB_BACKLOG,
+    )
+    sockets = [config.bind_socket()] if listen_tcp else []
+    if unix_socket:
+        sockets.append(serve.bind_unix_socket(unix_socket))
+        logger.info(f"Listening on unix:{unix_socket} (mode {serve.UNIX_SOCKET_MODE:o})")
+    if not sockets:
+        raise SystemExit("LISTEN_TCP=false needs UNIX_SOCKET_PATH")
+
+    class DrainingServer(uvicorn.Server):
+        """Drains in-flight requests (see drain.Drainer) before uvicorn's own shutdown; a second signal forces it"""
+
+        def handle_exit(self, sig, frame):
+            if core.drainer.draining:
+                super().handle_exit(sig, frame)
+                return
+            core.drainer.on_finish(lambda: super(DrainingServer, self).handle_exit(sig, frame))
+            core.drainer.begin(signal.Signals(sig).name)
+
+    DrainingServer(config).run(sockets=sockets)
+
+
+if __name__ == "__main__":
+    run()
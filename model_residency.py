@@ -0,0 +1,161 @@
+"""
+Model residency manager
+Keeps the model loaded in Ollama and reports cold loads
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelResidency:
+    """Preloads the model, polls /api/ps and re-warms it after Ollama evicts it.
+
+    Ollama reports load_duration (nanoseconds) only on the final event of a
+    generation; every value seen is recorded so cold loads show up in
+    metrics. Streams stopped early never get there, so requests that will
+    pay a load are counted up front from the /api/ps state (cold_requests).
+    Time to first token also includes prompt evaluation and queueing inside
+    Ollama, so it is reported on its own rather than read as a cold load.
+    """
+
+    def __init__(self, client, model, keep_alive="30m", poll_interval=30.0, load_timeout=300.0):
+        self.client = client
+        self.model = model
+        self.keep_alive = keep_alive
+        self.poll_interval = poll_interval
+        self.load_timeout = load_timeout
+        self._lock = threading.Lock()
+        self._warming = False
+        self._thread = None
+        self.loaded = None  # unknown until the first poll
+        self.expires_at = None
+        self.last_poll = None
+        self.last_load_duration = None
+        self.last_first_token = None
+        self.warmups = 0
+        self.warmup_failures = 0
+        self.evictions = 0
+        self.cold_loads = 0
+        self.cold_requests = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="model-residency", daemon=True)
+                self._thread.start()
+        return self
+
+    def _loop(self):
+        self.warm()
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"Residency poll failed: {e}")
+                continue
+            if not self.loaded:
+                self.warm()
+
+    def _matches(self, name):
+        return name == self.model or name == f"{self.model}:latest"
+
+    def poll(self):
+        """Refresh residency from /api/ps"""
+        response = self.client.get("/api/ps", timeout=(self.client.timeout[0], 5))
+        if response.status_code != 200:
+            raise Exception(f"Ollama returned {response.status_code}")
+
+        entry = next(
+            (m for m in response.json().get("models", []) if self._matches(m.get("name") or m.get("model", ""))),
+            None
+        )
+        with self._lock:
+            if self.loaded and entry is None:
+                self.evictions += 1
+                logger.warning(f"⚠️  {self.model} was unloaded by Ollama")
+            self.loaded = entry is not None
+            self.expires_at = entry.get("expires_at") if entry else None
+            self.last_poll = time.time()
+        return self.loaded
+
+    def warm(self):
+        """Load the model with an empty prompt; returns False if a warm-up is already running or fails"""
+        with self._lock:
+            if self._warming:
+                return False
+            self._warming = True
+
+        try:
+            logger.info(f"Warming {self.model} (keep_alive={self.keep_alive})...")
+            response = self.client.generate(
+                {"model": self.model, "prompt": "", "stream": False, "keep_alive": self.keep_alive},
+                timeout=(self.client.timeout[0], self.load_timeout)
+            )
+            if response.status_code != 200:
+                raise Exception(f"Ollama returned {response.status_code}")
+            self.record_generation(response.json())
+            with self._lock:
+                self.warmups += 1
+                self.loaded = True
+            logger.info(f"✅ {self.model} is loaded")
+            return True
+        except Exception as e:
+            with self._lock:
+                self.warmup_failures += 1
+            logger.warning(f"⚠️  Warm-up of {self.model} failed: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def note_request(self):
+        """Call before dispatching a generation; counts requests that will pay a model load"""
+        with self._lock:
+            if self.loaded is False:
+                self.cold_requests += 1
+                return True
+            return False
+
+    def record_generation(self, result):
+        """Record load_duration and time to first token from a generate response (streams stopped early carry no load_duration)"""
+        first_token = result.get("first_token_seconds")
+        if first_token is not None:
+            with self._lock:
+                self.last_first_token = first_token
+
+        load_ns = result.get("load_duration")
+        if load_ns:
+            seconds = load_ns / 1e9
+            with self._lock:
+                self.last_load_duration = seconds
+                self.loaded = True
+                # Ollama reports a few ms of load_duration even when the model is resident
+                if seconds >= 1.0:
+                    self.cold_loads += 1
+                    logger.info(f"Cold model load took {seconds:.1f} seconds")
+        elif first_token is not None:
+            # A token came back, so the model is loaded now
+            with self._lock:
+                self.loaded = True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.client.base_url,
+                "model": self.model,
+                "loaded": self.loaded,
+                "keep_alive": self.keep_alive,
+                "expires_at": self.expires_at,
+                "last_poll_age_seconds": round(time.time() - self.last_poll, 1) if self.last_poll else None,
+                "last_load_duration_ms": round(self.last_load_duration * 1000, 1) if self.last_load_duration is not None else None,
+                "last_first_token_ms": round(self.last_first_token * 1000, 1) if self.last_first_token is not None else None,
+                "warmups": self.warmups,
+                "warmup_failures": self.warmup_failures,
+                "evictions": self.evictions,
+                "cold_loads": self.cold_loads,
+                "cold_requests": self.cold_requests,
+            }
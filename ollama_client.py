@@ -0,0 +1,393 @@
+"""
+Pooled Ollama HTTP client
+One shared keep-alive session per Ollama host, and least-outstanding-requests
+routing across several hosts
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Transport errors that mean Ollama is overloaded or unreachable
+OVERLOAD_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+
+
+class OllamaHTTPError(Exception):
+    """Raised when Ollama answers a generation with a non-200 status; counts as overload"""
+
+    def __init__(self, status_code):
+        super().__init__(f"Ollama returned {status_code}")
+        self.status_code = status_code
+
+
+class GenerationCancelled(Exception):
+    """Raised when a streaming generation is aborted through its CancelToken"""
+
+
+class CancelToken:
+    """Lets another thread abort an in-flight streaming generation.
+
+    cancel() closes any attached response; dropping the connection is what
+    makes Ollama stop generating.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._responses = set()
+        self._children = []
+        self.cancelled = False
+        self.reason = None
+
+    def link(self, child):
+        """Cancel child whenever this token is cancelled"""
+        with self._lock:
+            if not self.cancelled:
+                self._children.append(child)
+                return
+        child.cancel(self.reason)
+
+    def attach(self, response):
+        with self._lock:
+            if not self.cancelled:
+                self._responses.add(response)
+                return
+        response.close()
+
+    def detach(self, response):
+        with self._lock:
+            self._responses.discard(response)
+
+    def cancel(self, reason="cancelled"):
+        """Cancel this token and its children; returns how many open responses were closed"""
+        with self._lock:
+            if self.cancelled:
+                return 0
+            self.cancelled = True
+            self.reason = reason
+            responses = list(self._responses)
+            self._responses.clear()
+            children = self._children
+            self._children = []
+        for response in responses:
+            try:
+                response.close()
+            except Exception:
+                pass
+        return len(responses) + sum(child.cancel(reason) for child in children)
+
+    def check(self):
+        if self.cancelled:
+            raise GenerationCancelled(self.reason)
+
+
+class JsonObjectDetector:
+    """Incremental brace-balanced detector for the first JSON object in a token stream.
+
+    Text before the first start character (markdown fences, chatter) is
+    skipped, and brackets inside string literals are ignored. Pass start="["
+    to wait for a complete top-level array instead.
+    """
+
+    def __init__(self, start="{"):
+        self.start = start
+        self.chars = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.result = None
+
+    def feed(self, chunk):
+        """Feed more text; returns the complete object text once it closes, else None"""
+        if self.result is not None:
+            return self.result
+
+        for ch in chunk:
+            if self.depth == 0:
+                if ch == self.start:
+                    self.depth = 1
+                    self.chars.append(ch)
+                continue
+
+            self.chars.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+            elif ch in "}]":
+                self.depth -= 1
+                if self.depth == 0:
+                    self.result = "".join(self.chars)
+                    return self.result
+        return None
+
+
+class OllamaClient:
+    """Thread-safe pooled client for a single Ollama host.
+
+    urllib3's connection pool is safe to share between threads, and Ollama
+    never sets cookies, so one Session can serve every Flask worker thread.
+    """
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=3.0, read_timeout=120.0, pool_block=False):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1,       # one host per client
+            pool_maxsize=pool_size,   # idle keep-alive connections kept around
+            pool_block=pool_block,    # wait for a free connection instead of opening extras
+            max_retries=0,            # generations are not idempotent enough to retry blindly
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Connection": "keep-alive"})
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def post(self, path, payload, timeout=None, stream=False):
+        return self.session.post(
+            self.url(path),
+            json=payload,
+            timeout=timeout or self.timeout,
+            stream=stream
+        )
+
+    def get(self, path, timeout=None):
+        return self.session.get(self.url(path), timeout=timeout or self.timeout)
+
+    def generate(self, payload, timeout=None, stream=False):
+        return self.post("/api/generate", payload, timeout=timeout, stream=stream)
+
+    def generate_until_json(self, payload, timeout=None, start="{", cancel=None, deadline=None):
+        """Stream a generation and stop as soon as the first JSON object closes.
+
+        Reads Ollama's NDJSON stream chunk by chunk. Closing the response early
+        drops the connection, which makes Ollama abort the remaining tokens.
+        Returns a dict shaped like a non-streaming /api/generate result plus
+        "early_stop", "tokens" and "first_token_seconds" (None if no token
+        arrived), which includes any model load. A CancelToken passed as cancel can abort
+        the generation from another thread; a deadline (anything with a
+        check() method) is checked between chunks so a slow trickle of
+        tokens cannot outlive it.
+        """
+        if cancel is not None:
+            cancel.check()
+        payload = dict(payload, stream=True)
+        detector = JsonObjectDetector(start)
+        parts = []
+        tokens = 0
+        first_token = None
+
+        start = time.monotonic()
+        response = self.generate(payload, timeout=timeout, stream=True)
+        if cancel is not None:
+            cancel.attach(response)
+        try:
+            if response.status_code != 200:
+                raise OllamaHTTPError(response.status_code)
+
+            for line in response.iter_lines():
+                if cancel is not None:
+                    cancel.check()
+                if deadline is not None:
+                    deadline.check()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if "error" in event:
+                    raise Exception(f"Ollama error: {event['error']}")
+
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                chunk = event.get("response", "")
+                parts.append(chunk)
+                tokens += 1
+
+                obj = detector.feed(chunk)
+                if obj is not None:
+                    return {
+                        "response": obj, "done": False, "early_stop": True, "tokens": tokens,
+                        "first_token_seconds": first_token,
+                    }
+
+                if event.get("done"):
+                    return dict(
+                        event, response="".join(parts), early_stop=False, tokens=tokens, first_token_seconds=first_token
+                    )
+
+            if cancel is not None:
+                cancel.check()
+            return {
+                "response": "".join(parts), "done": False, "early_stop": False, "tokens": tokens,
+                "first_token_seconds": first_token,
+            }
+        except Exception:
+            # Reads fail once another thread closes the response
+            if cancel is not None:
+                cancel.check()
+            raise
+        finally:
+            if cancel is not None:
+                cancel.detach(response)
+            response.close()
+
+    def model_digest(self, model, timeout=None):
+        """Digest of an installed model from /api/tags, or None if it is not installed"""
+        response = self.get("/api/tags", timeout=timeout)
+        if response.status_code != 200:
+            raise Exception(f"Ollama returned {response.status_code}")
+
+        for entry in response.json().get("models", []):
+            name = entry.get("name") or entry.get("model", "")
+            if name == model or name == f"{model}:latest":
+                return entry.get("digest")
+        return None
+
+    def close(self):
+        self.session.close()
+
+
+class Backend:
+    """One Ollama host plus its routing and health bookkeeping (guarded by the pool lock)"""
+
+    def __init__(self, client):
+        self.client = client
+        self.name = client.base_url
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.latency_ewma = None
+        self.last_error = None
+
+    def available(self, now):
+        return self.ejected_until <= now
+
+
+class BackendPool:
+    """Routes each call to the available backend with the fewest outstanding requests.
+
+    A backend is ejected for eject_seconds after eject_after consecutive
+    failures (from requests or health probes) and rejoins automatically.
+    When every backend is ejected, the one due back first is still used.
+    """
+
+    def __init__(self, clients, eject_after=3, eject_seconds=30.0):
+        if not clients:
+            raise ValueError("BackendPool needs at least one Ollama client")
+        self.backends = [Backend(c) for c in clients]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def pick(self, exclude=()):
+        """Best backend right now (not leased); None if everything is excluded"""
+        with self._lock:
+            return self._pick(exclude)
+
+    def _pick(self, exclude):
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+
+        available = [b for b in candidates if b.available(now)]
+        if not available:
+            return min(candidates, key=lambda b: b.ejected_until)
+
+        # Rotate the starting point so ties are spread round-robin
+        self._next = (self._next + 1) % len(available)
+        ordered = available[self._next:] + available[:self._next]
+        return min(ordered, key=lambda b: b.outstanding)
+
+    @contextmanager
+    def lease(self, exclude=(), backend=None):
+        """Reserve a backend (the given one, or the best) for one request and record the outcome"""
+        with self._lock:
+            if backend is None:
+                backend = self._pick(exclude)
+            if backend is None:
+                raise Exception("No Ollama backend available")
+            backend.outstanding += 1
+            backend.requests += 1
+
+        start = time.monotonic()
+        try:
+            yield backend
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            self.record_failure(backend, e)
+            raise
+        else:
+            self.record_success(backend, time.monotonic() - start)
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+
+    def record_success(self, backend, latency=None):
+        with self._lock:
+            if backend.ejected_until:
+                logger.info(f"Ollama backend {backend.name} is back in rotation")
+            backend.consecutive_errors = 0
+            backend.ejected_until = 0.0
+            if latency is not None:
+                backend.latency_ewma = latency if backend.latency_ewma is None else 0.8 * backend.latency_ewma + 0.2 * latency
+
+    def record_failure(self, backend, error):
+        with self._lock:
+            backend.errors += 1
+            backend.consecutive_errors += 1
+            backend.last_error = str(error)
+            if backend.consecutive_errors >= self.eject_after:
+                if backend.ejected_until <= time.monotonic():
+                    backend.ejections += 1
+                    logger.warning(f"⚠️  Ejecting Ollama backend {backend.name} for {self.eject_seconds:g}s: {error}")
+                backend.ejected_until = time.monotonic() + self.eject_seconds
+
+    def record_probe(self, backend, ok, error=None):
+        if ok:
+            # /api/tags can answer while generations hang, so a passing probe only
+            # resets the error streak and an ejection still runs its full eject_seconds
+            with self._lock:
+                backend.consecutive_errors = 0
+        else:
+            self.record_failure(backend, error or "health probe failed")
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "backend": b.name,
+                    "available": b.available(now),
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "errors": b.errors,
+                    "consecutive_errors": b.consecutive_errors,
+                    "ejections": b.ejections,
+                    "ejected_for_seconds": round(b.ejected_until - now, 1) if not b.available(now) else 0.0,
+                    "latency_ewma_ms": round(b.latency_ewma * 1000, 1) if b.latency_ewma is not None else None,
+                    "last_error": b.last_error,
+                }
+                for b in self.backends
+            ]
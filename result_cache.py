@@ -0,0 +1,256 @@
+"""
+LLM result cache
+Bounded in-memory LRU with TTL, keyed by the normalized symptom set,
+backed by an optional SQLite tier that survives restarts
+"""
+
+import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def symptom_cache_key(yes_questions, model, prompt_version, options=None):
+    """Canonical hash of the symptom set, model and prompt/options version.
+
+    Questions are whitespace-normalized, lowercased, de-duplicated and sorted,
+    so the same answers in a different order share one entry.
+    """
+    symptoms = sorted({" ".join(q.split()).lower() for q in yes_questions})
+    material = json.dumps(
+        {
+            "symptoms": symptoms,
+            "model": model,
+            "prompt_version": prompt_version,
+            "options": options or {},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry; returns how many were flushed"""
+        with self._lock:
+            flushed = len(self._entries)
+            self._entries.clear()
+            return flushed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class DiskResultCache:
+    """SQLite (WAL) cache tier with batched background writes.
+
+    Reads run on the request thread through a per-thread connection; writes
+    are queued and committed in batches by a single writer thread so they
+    never sit on the request path. Rows carry the Ollama model digest, and
+    prune() drops rows written for any other digest.
+    """
+
+    def __init__(self, path, ttl=7 * 24 * 3600, batch_size=64, flush_interval=1.0, max_pending=10000):
+        self.path = path
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.dropped_writes = 0
+        self.errors = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts ("
+            " key TEXT PRIMARY KEY,"
+            " model_digest TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+        self._writer = threading.Thread(target=self._write_loop, name="disk-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def get(self, key):
+        try:
+            row = self._reader().execute(
+                "SELECT value, created_at FROM verdicts WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache read failed: {e}")
+            self._count("errors")
+            return None
+
+        if row is None or row[1] + self.ttl < time.time():
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        return tuple(json.loads(row[0]))
+
+    def put(self, key, model_digest, value):
+        """Queue a write; never blocks the caller"""
+        try:
+            self._pending.put_nowait(("put", (key, model_digest, json.dumps(list(value)), time.time())))
+        except queue.Full:
+            self._count("dropped_writes")
+
+    def prune(self, model_digest):
+        """Queue removal of rows written for any other model digest"""
+        try:
+            self._pending.put_nowait(("prune", model_digest))
+        except queue.Full:
+            self._count("dropped_writes")
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far is committed"""
+        done = threading.Event()
+        try:
+            self._pending.put(("flush", done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def clear(self, timeout=5.0):
+        """Delete every row once the writes queued so far are committed; returns how many, or None on timeout"""
+        request = {"done": threading.Event(), "deleted": None}
+        try:
+            self._pending.put(("clear", request), timeout=timeout)
+        except queue.Full:
+            return None
+        request["done"].wait(timeout)
+        return request["deleted"]
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                if batch[-1][0] in ("flush", "clear"):
+                    break
+
+            rows = [arg for op, arg in batch if op == "put"]
+            try:
+                if rows:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO verdicts (key, model_digest, value, created_at) VALUES (?, ?, ?, ?)",
+                        rows
+                    )
+                for op, arg in batch:
+                    if op == "prune":
+                        deleted = conn.execute("DELETE FROM verdicts WHERE model_digest != ?", (arg,)).rowcount
+                        logger.info(f"Disk cache pruned {deleted} entries from older model versions")
+                    elif op == "clear":
+                        arg["deleted"] = conn.execute("DELETE FROM verdicts").rowcount
+                conn.commit()
+                self._count("writes", len(rows))
+            except sqlite3.Error as e:
+                logger.error(f"Disk cache write failed: {e}")
+                self._count("errors")
+                conn.rollback()
+
+            for op, arg in batch:
+                if op == "flush":
+                    arg.set()
+                elif op == "clear":
+                    arg["done"].set()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "path": self.path,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "pending_writes": self._pending.qsize(),
+                "dropped_writes": self.dropped_writes,
+                "errors": self.errors,
+            }
@@ -0,0 +1,159 @@
+"""
+Production server
+Prefork gunicorn workers with threads serving the ml_server Flask app
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import socket
+import stat
+
+logger = logging.getLogger(__name__)
+
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "5000"))
+
+# Optional Unix domain socket for the co-located Node gateway, alongside or instead of TCP
+UNIX_SOCKET_PATH = os.environ.get("UNIX_SOCKET_PATH", "")
+UNIX_SOCKET_MODE = int(os.environ.get("UNIX_SOCKET_MODE", "660"), 8)
+LISTEN_TCP = os.environ.get("LISTEN_TCP", "true").lower() == "true"
+
+# Each worker is a full copy of the server (caches, admission queue, breaker),
+# so Ollama sees up to WEB_WORKERS * ADMISSION_MAX_CONCURRENCY generations at once
+WEB_WORKERS = int(os.environ.get("WEB_WORKERS", "2"))
+# Keep above BULKHEAD_LLM_SIZE so health checks and keyword answers always find a thread
+WEB_THREADS = int(os.environ.get("WEB_THREADS", "32"))
+WEB_KEEPALIVE_SECONDS = int(os.environ.get("WEB_KEEPALIVE_SECONDS", "30"))
+WEB_TIMEOUT_SECONDS = int(os.environ.get("WEB_TIMEOUT_SECONDS", "180"))
+# Keep above DRAIN_DEADLINE_SECONDS + DRAIN_GRACE_SECONDS so draining workers are not killed
+WEB_GRACEFUL_TIMEOUT_SECONDS = int(os.environ.get("WEB_GRACEFUL_TIMEOUT_SECONDS", "30"))
+WEB_BACKLOG = int(os.environ.get("WEB_BACKLOG", "2048"))
+WEB_REUSE_PORT = os.environ.get("WEB_REUSE_PORT", "true").lower() == "true"
+
+# Request line and header limits; the body limit is MAX_REQUEST_BYTES in ml_server
+LIMIT_REQUEST_LINE = int(os.environ.get("LIMIT_REQUEST_LINE", "4094"))
+LIMIT_REQUEST_FIELDS = int(os.environ.get("LIMIT_REQUEST_FIELDS", "50"))
+LIMIT_REQUEST_FIELD_SIZE = int(os.environ.get("LIMIT_REQUEST_FIELD_SIZE", "8190"))
+
+
+def remove_stale_socket(path):
+    """Delete a socket file left behind by a previous run; refuses to touch anything else"""
+    try:
+        mode = os.stat(path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise SystemExit(f"{path} exists and is not a socket")
+    os.unlink(path)
+
+
+def bind_unix_socket(path, mode=UNIX_SOCKET_MODE, backlog=None):
+    """Listening AF_UNIX socket at path that is never reachable with wider permissions than mode"""
+    remove_stale_socket(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o777 & ~mode)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+    os.chmod(path, mode)
+    sock.listen(backlog or WEB_BACKLOG)
+    return sock
+
+
+def listen_addresses(tcp_bind, unix_path=UNIX_SOCKET_PATH, listen_tcp=LISTEN_TCP):
+    """gunicorn bind list: the TCP address and/or unix:<path>"""
+    binds = [tcp_bind] if listen_tcp else []
+    if unix_path:
+        binds.append(f"unix:{unix_path}")
+    if not binds:
+        raise SystemExit("LISTEN_TCP=false needs UNIX_SOCKET_PATH")
+    return binds
+
+
+def chmod_unix_sockets(server):
+    """gunicorn when_ready hook: apply UNIX_SOCKET_MODE once the master has bound its sockets"""
+    for address in server.cfg.address:
+        if isinstance(address, str):
+            os.chmod(address, UNIX_SOCKET_MODE)
+            logger.info(f"Listening on unix:{address} (mode {UNIX_SOCKET_MODE:o})")
+
+
+def init_worker(worker):
+    """gunicorn post_worker_init hook: drain on SIGTERM ahead of gunicorn's own exit, then start background work.
+
+    The worker has loaded the app and is about to accept on the inherited
+    sockets, so this is where its Ollama probe and model warm-up begin.
+    """
+    from drain import install_drain_handler
+    ml_server = importlib.import_module("ml_server")
+    install_drain_handler(ml_server.drainer)
+    ml_server.mark_bound()
+
+
+def gunicorn_options(bind, workers, threads, unix_socket=UNIX_SOCKET_PATH):
+    return {
+        "bind": listen_addresses(bind, unix_socket),
+        # gunicorn binds with umask 0, so without this the socket is world-writable until when_ready
+        "umask": 0o777 & ~UNIX_SOCKET_MODE,
+        "when_ready": chmod_unix_sockets,
+        "post_worker_init": init_worker,
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",    # HTTP/1.1 keep-alive needs a threaded worker
+        "keepalive": WEB_KEEPALIVE_SECONDS,
+        "timeout": WEB_TIMEOUT_SECONDS,
+        "graceful_timeout": WEB_GRACEFUL_TIMEOUT_SECONDS,
+        "backlog": WEB_BACKLOG,
+        "reuse_port": WEB_REUSE_PORT,
+        "limit_request_line": LIMIT_REQUEST_LINE,
+        "limit_request_fields": LIMIT_REQUEST_FIELDS,
+        "limit_request_field_size": LIMIT_REQUEST_FIELD_SIZE,
+        # Background threads (probes, residency, cache writer) do not survive fork,
+        # so each worker imports ml_server itself
+        "preload_app": False,
+        "accesslog": "-",
+    }
+
+
+def run(bind=None, workers=WEB_WORKERS, threads=WEB_THREADS, unix_socket=UNIX_SOCKET_PATH):
+    """Serve ml_server.app with gunicorn until shut down"""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("gunicorn is not installed: pip install gunicorn, or run with --server dev")
+
+    class MLServerApplication(BaseApplication):
+        def __init__(self, options):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            # Runs in each worker after fork
+            return importlib.import_module("ml_server").app
+
+    options = gunicorn_options(bind or f"{HOST}:{PORT}", workers, threads, unix_socket)
+    logger.info(f"Starting {workers} gunicorn worker(s) x {threads} threads on {', '.join(options['bind'])}")
+    MLServerApplication(options).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the ML server with gunicorn")
+    parser.add_argument("--bind", help=f"address to listen on (default {HOST}:{PORT})")
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    parser.add_argument("--threads", type=int, default=WEB_THREADS)
+    parser.add_argument("--unix-socket", default=UNIX_SOCKET_PATH, help="also listen on this Unix domain socket")
+    args = parser.parse_args(argv)
+    run(args.bind, args.workers, args.threads, args.unix_socket)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
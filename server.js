@@ -1,21 +1,65 @@
 const express = require("express");
 const cors = require("cors");
 require("dotenv").config();
+const http = require("http");
 const fetch = global.fetch || require("node-fetch");
+const nodeFetch = require("node-fetch");
+
+// ML server address; with ML_SOCKET_PATH the hop goes over a Unix domain socket instead of loopback TCP
+const ML_URL = process.env.ML_URL || "http://127.0.0.1:5000";
+const ML_SOCKET_PATH = process.env.ML_SOCKET_PATH;
+
+// Reuse connections to the ML server. The built-in fetch ignores agents, so the ML hop always uses node-fetch
+const mlAgent = new http.Agent({
+  keepAlive: true,
+  ...(ML_SOCKET_PATH ? { socketPath: ML_SOCKET_PATH } : {}),
+});
 
 const app = express();
 app.use(cors());
 app.use(express.json());
 
 /* ------------------ ML PREDICTION ------------------ */
+// The tenant comes from the caller's API key ("key:tenant,..."), never from a client-supplied header,
+// so one app can't claim another's queue weight or priority
+const TENANT_API_KEYS = Object.fromEntries(
+  (process.env.TENANT_API_KEYS || "")
+    .split(",")
+    .filter((pair) => pair.includes(":"))
+    .map((pair) => pair.split(":").map((part) => part.trim()))
+);
+
+// How long the gateway waits for a prediction; the ML server is told the same deadline.
+// Unset means no timeout and no deadline, since tinyllama on CPU can take a minute or more
+const ML_TIMEOUT_MS = Number(process.env.ML_TIMEOUT_MS) || 0;
+
 app.post("/predict", async (req, res) => {
+  const controller = new AbortController();
+  const timer = ML_TIMEOUT_MS ? setTimeout(() => controller.abort(), ML_TIMEOUT_MS) : null;
   try {
-    const response = await fetch("http://127.0.0.1:5000/predict", {
+    // Tenant and priority let the ML server queue fairly across client apps; the priority header can only lower it
+    const headers = { "Content-Type": "application/json" };
+    const tenant = TENANT_API_KEYS[req.get("x-api-key") || ""];
+    if (tenant) headers["x-tenant-id"] = tenant;
+    if (req.get("x-priority")) headers["x-priority"] = req.get("x-priority");
+    // Absolute Unix time in seconds, so the ML server stops work once we have given up
+    if (ML_TIMEOUT_MS) headers["x-request-deadline"] = String((Date.now() + ML_TIMEOUT_MS) / 1000);
+
+    const response = await nodeFetch(`${ML_URL}/predict`, {
       method: "POST",
-      headers: { "Content-Type": "application/json" },
+      headers,
       body: JSON.stringify(req.body),
+      signal: controller.signal,
+      agent: mlAgent,
     });
 
+    // Pass ML server backpressure through so clients can retry later
+    if (response.status === 429) {
+      const retryAfter = response.headers.get("retry-after");
+      if (retryAfter) res.set("Retry-After", retryAfter);
+      return res.status(429).json({ error: "Prediction service is busy. Please retry shortly." });
+    }
+
     if (!response.ok) {
       const txt = await response.text();
       throw new Error(`Flask server error: ${response.status} ${txt}`);
@@ -29,8 +73,13 @@ app.post("/predict", async (req, res) => {
 
     res.json(data);
   } catch (error) {
+    if (error.name === "AbortError") {
+      return res.status(504).json({ error: "Prediction timed out. Please retry." });
+    }
     console.error("Prediction error:", error);
     res.status(500).json({ error: "Prediction failed. Server might be offline." });
+  } finally {
+    clearTimeout(timer);
   }
 });
 
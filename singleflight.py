@@ -0,0 +1,210 @@
+"""
+Single-flight call coalescing
+Concurrent calls with the same key share one execution
+"""
+
+import contextvars
+import threading
+
+from deadline import Deadline, DeadlineExceeded
+from ollama_client import CancelToken
+
+
+class _Call:
+    def __init__(self, deadline):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self.wakeups = []
+        self.cancel = CancelToken()
+        self.deadline = deadline
+
+
+class _Wakeup:
+    """Wakes one waiting caller; linked to its CancelToken so cancelling the token also drops it from the call"""
+
+    def __init__(self, leave):
+        self.event = threading.Event()
+        self._leave = leave
+
+    def cancel(self, reason=None):
+        """Returns how many Ollama streams closed because this was the call's last caller"""
+        aborted = self._leave(self, reason)
+        self.event.set()
+        return aborted or 0
+
+
+class SingleFlight:
+    """Runs fn once per key at a time; duplicates wait for and share its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    def do(self, key, fn, cancel=None, deadline=None):
+        """Returns (result, shared); shared is True for callers that only waited.
+
+        fn(cancel, deadline) runs on a daemon thread in a copy of the first
+        caller's context, so every caller, the first included, only waits
+        for it. It gets a CancelToken of its own, cancelled only once every
+        caller has stopped waiting, and a Deadline that is pushed out to
+        the latest of the callers' deadlines (none if any caller has none).
+
+        A caller stops waiting with GenerationCancelled once its own
+        CancelToken (cancel) fires, or DeadlineExceeded once its deadline
+        passes, even while fn is still blocked on Ollama. If fn raises,
+        every waiter gets the same exception.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if shared:
+                call.waiters += 1
+                self.coalesced += 1
+                if call.deadline is not None:
+                    call.deadline.expires_at = max(
+                        call.deadline.expires_at, deadline.expires_at if deadline else float("inf")
+                    )
+            else:
+                call = _Call(Deadline(deadline.expires_at) if deadline else None)
+                self._calls[key] = call
+                self.executions += 1
+            wakeup = _Wakeup(lambda w, reason: self._leave(key, call, w, reason))
+            call.wakeups.append(wakeup)
+
+        if not shared:
+            ctx = contextvars.copy_context()
+            threading.Thread(
+                target=ctx.run, args=(self._run, key, call, fn), name="single-flight", daemon=True
+            ).start()
+        if cancel is not None:
+            cancel.link(wakeup)
+
+        wakeup.event.wait(None if deadline is None else max(0.0, deadline.remaining()))
+        if not call.done.is_set():
+            reason = cancel.reason if cancel is not None and cancel.cancelled else "request deadline exceeded"
+            if self._leave(key, call, wakeup, reason) is not None:
+                if cancel is not None:
+                    cancel.check()
+                raise DeadlineExceeded(reason)
+        if call.error is not None:
+            raise call.error
+        return call.result, shared
+
+    def _run(self, key, call, fn):
+        try:
+            call.result = fn(call.cancel, call.deadline)
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                call.done.set()
+                wakeups = list(call.wakeups)
+            for wakeup in wakeups:
+                wakeup.event.set()
+
+    def _leave(self, key, call, wakeup, reason):
+        """Drop a caller that stopped waiting; the last one out cancels the call.
+
+        Returns how many Ollama streams that closed, or None if the call finished first.
+        """
+        with self._lock:
+            if call.done.is_set():
+                return None
+            if wakeup not in call.wakeups:
+                return 0  # already left when its CancelToken fired
+            call.wakeups.remove(wakeup)
+            if call.wakeups:
+                return 0
+            # Nobody wants the result any more; later callers start a fresh call
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            self.abandoned += 1
+        return call.cancel.cancel(reason)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(c.waiters for c in self._calls.values()),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "abandoned": self.abandoned,
+            }
+
+
+class _AsyncCall:
+    def __init__(self, deadline):
+        self.task = None
+        self.waiters = 0
+        self.deadline = deadline
+
+
+class AsyncSingleFlight:
+    """asyncio counterpart of SingleFlight.
+
+    The shared call runs as its own task and is only cancelled once every
+    caller awaiting it has been cancelled or has run out of time.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, deadline=None):
+        """Returns (result, shared) like SingleFlight.do; fn(deadline) is a coroutine function"""
+        import asyncio  # only the ASGI server pays for importing asyncio
+        call = self._calls.get(key)
+        shared = call is not None
+        if shared:
+            self.coalesced += 1
+            if call.deadline is not None:
+                call.deadline.expires_at = max(call.deadline.expires_at, deadline.expires_at if deadline else float("inf"))
+        else:
+            call = _AsyncCall(Deadline(deadline.expires_at) if deadline else None)
+            call.task = asyncio.ensure_future(fn(call.deadline))
+            self._calls[key] = call
+            self.executions += 1
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+
+        call.waiters += 1
+        try:
+            if deadline is None:
+                result = await asyncio.shield(call.task)
+            else:
+                result = await asyncio.wait_for(asyncio.shield(call.task), max(0.0, deadline.remaining()))
+        except asyncio.TimeoutError:
+            if call.waiters == 1:
+                self._abandon(key, call)
+            raise DeadlineExceeded("request deadline exceeded") from None
+        except asyncio.CancelledError:
+            if call.waiters == 1:
+                self._abandon(key, call)
+            raise
+        finally:
+            call.waiters -= 1
+        return result, shared
+
+    def _abandon(self, key, call):
+        """Cancel a call nobody waits for any more; later callers start a fresh one instead of joining it"""
+        self._forget(key, call)
+        call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self):
+        return {
+            "in_flight": len(self._calls),
+            "waiting": sum(c.waiters for c in self._calls.values()),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,68 @@
+"""
+Startup timing
+Milestones from process start to first ready, reported once and in /metrics
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def process_age():
+    """Seconds since this process was created (Linux /proc), or None where that is unavailable"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name start at field 3; starttime is field 22
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTimer:
+    """Records each named milestone once, as seconds since the process started.
+
+    Create it before the heavy imports so their cost is part of the report.
+    Marking final logs a one-line summary of every milestone so far.
+    """
+
+    def __init__(self, final="ready"):
+        age = process_age()
+        self.final = final
+        self._origin = time.monotonic() - (age or 0.0)
+        self._lock = threading.Lock()
+        self._marks = {}
+
+    def mark(self, name):
+        """Record name now; returns False if it was already recorded"""
+        with self._lock:
+            if name in self._marks:
+                return False
+            elapsed = time.monotonic() - self._origin
+            self._marks[name] = elapsed
+        logger.info(f"Startup: {name} after {elapsed * 1000:.0f} ms")
+        if name == self.final:
+            logger.info(f"✅ Startup report: {self.summary()}")
+        return True
+
+    def has(self, name):
+        with self._lock:
+            return name in self._marks
+
+    def summary(self):
+        with self._lock:
+            return ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in self._marks.items())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.monotonic() - self._origin, 1),
+                "milestones_ms": {name: round(elapsed * 1000, 1) for name, elapsed in self._marks.items()},
+                "ready": self.final in self._marks,
+            }
@@ -0,0 +1,159 @@
+import pytest
+
+from admission import AdmissionController, AIMDLimit, CoDel, FairQueue, _Waiter
+from ollama_client import OllamaHTTPError
+
+
+def drain(queue):
+    order = []
+    while True:
+        waiter = queue.pop()
+        if waiter is None:
+            return order
+        order.append(waiter.tenant)
+
+
+class TestAIMDLimit:
+    def test_grows_by_one_after_a_full_limit_of_good_samples(self):
+        limit = AIMDLimit(initial=2, max_limit=4)
+        assert limit.on_sample(1.0) == 2
+        assert limit.on_sample(1.0) == 3
+        for _ in range(3):
+            limit.on_sample(1.0)
+        assert limit.limit == 4
+
+    def test_never_exceeds_max_limit(self):
+        limit = AIMDLimit(initial=2, max_limit=3)
+        for _ in range(50):
+            limit.on_sample(1.0)
+        assert limit.limit == 3
+
+    def test_samples_without_latency_are_ignored(self):
+        limit = AIMDLimit(initial=2, max_limit=16)
+        for _ in range(20):
+            limit.on_sample(None)
+        assert limit.limit == 2
+        assert limit.increases == 0
+        assert limit.baseline is None
+
+    def test_overload_backs_off(self):
+        limit = AIMDLimit(initial=8, min_limit=1, backoff=0.5)
+        assert limit.on_sample(1.0, overloaded=True) == 4
+        assert limit.decreases == 1
+
+    def test_overload_without_latency_still_backs_off(self):
+        limit = AIMDLimit(initial=8, backoff=0.5)
+        assert limit.on_sample(None, overloaded=True) == 4
+
+    def test_simultaneous_failures_count_once(self):
+        limit = AIMDLimit(initial=8, backoff=0.5)
+        limit.on_sample(10.0)
+        for _ in range(5):
+            limit.on_sample(10.0, overloaded=True)
+        assert limit.limit == 4
+        assert limit.decreases == 1
+
+    def test_slow_sample_backs_off(self):
+        limit = AIMDLimit(initial=8, backoff=0.5, tolerance=2.0)
+        limit.on_sample(0.0001)
+        assert limit.on_sample(0.01) == 4
+
+    def test_never_drops_below_min_limit(self):
+        limit = AIMDLimit(initial=2, min_limit=2, backoff=0.5)
+        assert limit.on_sample(1.0, overloaded=True) == 2
+
+
+class TestCoDel:
+    def test_short_sojourns_are_never_dropped(self):
+        codel = CoDel(target=1.0, interval=10.0)
+        assert not any(codel.should_drop(0.5, now) for now in range(100))
+
+    def test_drops_once_above_target_for_an_interval(self):
+        codel = CoDel(target=1.0, interval=10.0)
+        assert not codel.should_drop(2.0, 0.0)
+        assert not codel.should_drop(2.0, 5.0)
+        assert codel.should_drop(2.0, 10.0)
+        assert codel.dropping
+        assert codel.drops == 1
+
+    def test_drop_rate_grows_while_above_target(self):
+        codel = CoDel(target=1.0, interval=10.0)
+        codel.should_drop(2.0, 0.0)
+        codel.should_drop(2.0, 10.0)
+        # Next drop is due interval / sqrt(count) after the previous one
+        assert not codel.should_drop(2.0, 15.0)
+        assert codel.should_drop(2.0, 20.0)
+        assert codel.should_drop(2.0, 20.0 + 10.0 / 2 ** 0.5)
+
+    def test_stops_dropping_once_under_target(self):
+        codel = CoDel(target=1.0, interval=10.0)
+        codel.should_drop(2.0, 0.0)
+        codel.should_drop(2.0, 10.0)
+        assert not codel.should_drop(0.5, 11.0)
+        assert not codel.dropping
+        assert not codel.should_drop(2.0, 12.0)
+
+
+class TestFairQueue:
+    def test_higher_priority_class_always_goes_first(self):
+        queue = FairQueue()
+        queue.push(_Waiter("bulk", priority=1))
+        queue.push(_Waiter("app", priority=0))
+        queue.push(_Waiter("bulk", priority=1))
+        assert drain(queue) == ["app", "bulk", "bulk"]
+
+    def test_tenants_share_by_weight(self):
+        queue = FairQueue({"big": 2.0, "small": 1.0})
+        for _ in range(4):
+            queue.push(_Waiter("small"))
+        for _ in range(4):
+            queue.push(_Waiter("big"))
+        assert drain(queue)[:6].count("big") == 4
+
+    def test_equal_weights_alternate(self):
+        queue = FairQueue()
+        for _ in range(3):
+            queue.push(_Waiter("a"))
+        for _ in range(3):
+            queue.push(_Waiter("b"))
+        assert drain(queue) == ["a", "b", "a", "b", "a", "b"]
+
+    def test_idle_tenant_does_not_bank_credit(self):
+        queue = FairQueue()
+        for _ in range(4):
+            queue.push(_Waiter("busy"))
+        drain(queue)
+        for _ in range(3):
+            queue.push(_Waiter("busy"))
+        for _ in range(3):
+            queue.push(_Waiter("idle"))
+        # Starts at the current virtual time, so it interleaves instead of catching up
+        assert drain(queue) == ["idle", "busy", "idle", "busy", "idle", "busy"]
+
+    def test_removed_waiters_are_skipped_and_uncounted(self):
+        queue = FairQueue()
+        gone = _Waiter("a")
+        queue.push(gone)
+        queue.push(_Waiter("b"))
+        queue.remove(gone)
+        assert len(queue) == 1
+        assert queue.depth_by_tenant == {"b": 1}
+        assert drain(queue) == ["b"]
+        assert len(queue) == 0
+
+
+class TestAdmissionController:
+    def test_errors_unrelated_to_load_leave_the_limit_alone(self):
+        admission = AdmissionController(limiter=AIMDLimit(initial=2, max_limit=16))
+        for _ in range(20):
+            with pytest.raises(ValueError):
+                with admission.slot():
+                    raise ValueError("unparseable verdict")
+        assert admission.limit == 2
+
+    def test_overload_errors_shrink_the_limit(self):
+        admission = AdmissionController(limiter=AIMDLimit(initial=8), overload_errors=(OllamaHTTPError,))
+        with pytest.raises(OllamaHTTPError):
+            with admission.slot():
+                raise OllamaHTTPError(503)
+        assert admission.limit == 4
@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from batching import MicroBatcher
+from deadline import Deadline, DeadlineExceeded
+from ollama_client import CancelToken, GenerationCancelled
+
+
+def submit_in_thread(batcher, item, **kwargs):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = batcher.submit(item, **kwargs)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def test_each_submitter_gets_its_own_result():
+    batches = []
+
+    def run_batch(items, cancel, deadline):
+        batches.append(items)
+        return [item * 2 if item != 3 else ValueError("bad item") for item in items]
+
+    batcher = MicroBatcher(run_batch, max_items=4, max_wait_ms=100)
+    submitted = [submit_in_thread(batcher, item) for item in (1, 2, 3)]
+    for thread, _ in submitted:
+        thread.join()
+
+    assert [outcome.get("result") for _, outcome in submitted] == [2, 4, None]
+    assert isinstance(submitted[2][1]["error"], ValueError)
+    assert batches == [[1, 2, 3]]
+
+
+def test_only_items_with_the_same_key_share_a_batch():
+    batches = []
+
+    def run_batch(items, cancel, deadline):
+        batches.append(sorted(items))
+        return items
+
+    batcher = MicroBatcher(run_batch, max_items=4, max_wait_ms=100)
+    submitted = [submit_in_thread(batcher, item, key=item[0]) for item in ("a1", "b1", "a2")]
+    for thread, _ in submitted:
+        thread.join()
+
+    assert sorted(batches) == [["a1", "a2"], ["b1"]]
+
+
+def test_batches_run_concurrently_up_to_workers():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def run_batch(items, cancel, deadline):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.1)
+        with lock:
+            running.pop()
+        return items
+
+    batcher = MicroBatcher(run_batch, max_items=1, max_wait_ms=0, workers=2)
+    submitted = [submit_in_thread(batcher, item) for item in range(4)]
+    for thread, _ in submitted:
+        thread.join()
+
+    assert max(peak) == 2
+
+
+def test_batch_gets_the_latest_deadline_of_its_items():
+    seen = {}
+
+    def run_batch(items, cancel, deadline):
+        seen["deadline"] = deadline
+        return items
+
+    batcher = MicroBatcher(run_batch, max_items=2, max_wait_ms=100)
+    submitted = [
+        submit_in_thread(batcher, 1, deadline=Deadline.after(5)),
+        submit_in_thread(batcher, 2, deadline=Deadline.after(30)),
+    ]
+    for thread, _ in submitted:
+        thread.join()
+
+    assert 25 < seen["deadline"].remaining() <= 30
+
+
+def test_cancelled_submitter_stops_waiting_and_the_batch_is_cancelled_with_the_last_one():
+    started = threading.Event()
+    seen = {}
+
+    def run_batch(items, cancel, deadline):
+        seen["cancel"] = cancel
+        started.set()
+        while not cancel.cancelled:
+            time.sleep(0.01)
+        cancel.check()
+
+    batcher = MicroBatcher(run_batch, max_items=2, max_wait_ms=100)
+    tokens = [CancelToken(), CancelToken()]
+    submitted = [submit_in_thread(batcher, item, cancel=token) for item, token in zip((1, 2), tokens)]
+    assert started.wait(2)
+
+    tokens[0].cancel("client disconnected")
+    submitted[0][0].join(1)
+    assert isinstance(submitted[0][1]["error"], GenerationCancelled)
+    assert not seen["cancel"].cancelled
+
+    tokens[1].cancel("server draining")
+    submitted[1][0].join(1)
+    assert seen["cancel"].reason == "server draining"
+
+
+def test_expired_item_is_skipped():
+    calls = []
+
+    def run_batch(items, cancel, deadline):
+        calls.append(items)
+        return items
+
+    batcher = MicroBatcher(run_batch, max_items=4, max_wait_ms=50)
+    with pytest.raises(DeadlineExceeded):
+        batcher.submit(1, deadline=Deadline.after(0))
+    time.sleep(0.1)
+    assert calls == []
+    assert batcher.stats()["skipped"] == 1
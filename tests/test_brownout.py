@@ -0,0 +1,63 @@
+import pytest
+
+import brownout
+from brownout import AMBIGUOUS, FULL, KEYWORDS, REDUCED, BrownoutController
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(brownout.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_queue_pressure_raises_the_level_at_once(clock):
+    controller = BrownoutController(queue_thresholds=(0.25, 0.5, 0.9))
+    assert controller.update(0.1) == FULL
+    assert controller.update(0.3) == REDUCED
+    assert controller.update(0.95) == KEYWORDS
+    assert controller.level_changes == 2
+
+
+def test_slow_generations_raise_the_level(clock):
+    controller = BrownoutController(latency_thresholds=(15.0, 30.0, 60.0), window=60.0)
+    for _ in range(10):
+        controller.observe_latency(35.0)
+    assert controller.update(0.0) == AMBIGUOUS
+
+
+def test_old_latencies_leave_the_window(clock):
+    controller = BrownoutController(latency_thresholds=(15.0, 30.0, 60.0), window=60.0, recovery=0.0)
+    controller.observe_latency(90.0)
+    assert controller.update(0.0) == KEYWORDS
+    clock[0] += 61
+    assert controller.stats()["recent_p90_latency_seconds"] is None
+
+
+def test_recovers_one_level_per_recovery_period(clock):
+    controller = BrownoutController(queue_thresholds=(0.25, 0.5, 0.9), recovery=30.0)
+    assert controller.update(0.95) == KEYWORDS
+
+    assert controller.update(0.0) == KEYWORDS  # calm period starts
+    clock[0] += 29
+    assert controller.update(0.0) == KEYWORDS
+    clock[0] += 1
+    assert controller.update(0.0) == AMBIGUOUS
+    clock[0] += 30
+    assert controller.update(0.0) == REDUCED
+    clock[0] += 30
+    assert controller.update(0.0) == FULL
+
+
+def test_renewed_pressure_restarts_the_recovery_clock(clock):
+    controller = BrownoutController(queue_thresholds=(0.25, 0.5, 0.9), recovery=30.0)
+    controller.update(0.6)
+    controller.update(0.0)
+    clock[0] += 20
+    assert controller.update(0.6) == AMBIGUOUS
+    clock[0] += 20
+    assert controller.update(0.0) == AMBIGUOUS
+    clock[0] += 20
+    assert controller.update(0.0) == AMBIGUOUS
+    clock[0] += 10
+    assert controller.update(0.0) == REDUCED
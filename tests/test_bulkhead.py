@@ -0,0 +1,61 @@
+import threading
+import time
+
+import pytest
+
+from bulkhead import Bulkhead, BulkheadFull
+
+
+def test_rejects_past_max_concurrent_without_waiting():
+    bulkhead = Bulkhead("llm", max_concurrent=2)
+    with bulkhead.guard(), bulkhead.guard():
+        with pytest.raises(BulkheadFull, match="llm"):
+            with bulkhead.guard():
+                pass
+    stats = bulkhead.stats()
+    assert stats["active"] == 0
+    assert stats["peak"] == 2
+    assert stats["rejected"] == 1
+
+
+def test_waits_up_to_max_wait_for_a_place():
+    bulkhead = Bulkhead("light", max_concurrent=1, max_wait=1.0)
+    bulkhead.enter()
+    threading.Timer(0.05, bulkhead.leave).start()
+    with bulkhead.guard():
+        assert bulkhead.stats()["active"] == 1
+
+
+def test_gives_up_after_max_wait():
+    bulkhead = Bulkhead("ops", max_concurrent=1, max_wait=0.05)
+    with bulkhead.guard():
+        start = time.monotonic()
+        with pytest.raises(BulkheadFull):
+            bulkhead.enter()
+        assert time.monotonic() - start >= 0.05
+
+
+def test_leave_may_run_on_another_thread():
+    bulkhead = Bulkhead("llm-pool", max_concurrent=1)
+    bulkhead.enter()
+    worker = threading.Thread(target=bulkhead.leave)
+    worker.start()
+    worker.join()
+    with bulkhead.guard():
+        pass
+
+
+def test_place_is_released_when_the_body_raises():
+    bulkhead = Bulkhead("llm", max_concurrent=1)
+    with pytest.raises(ValueError):
+        with bulkhead.guard():
+            raise ValueError("boom")
+    with bulkhead.guard():
+        pass
+
+
+def test_separate_bulkheads_do_not_share_places():
+    llm, light = Bulkhead("llm", max_concurrent=1), Bulkhead("light", max_concurrent=1)
+    with llm.guard():
+        with light.guard():
+            assert light.stats()["active"] == 1
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from ollama_client import GenerationCancelled
+
+
+def fail():
+    raise ConnectionError("Ollama is down")
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+
+def test_opens_after_consecutive_failures_and_fails_fast():
+    breaker = CircuitBreaker("ollama", failure_threshold=3, recovery_timeout=30)
+    trip(breaker)
+    assert breaker.state == OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(calls.append, 1)
+    assert calls == []
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_a_success_resets_the_failure_count():
+    breaker = CircuitBreaker("ollama", failure_threshold=2)
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    breaker.call(lambda: "ok")
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_a_single_probe_through():
+    breaker = CircuitBreaker("ollama", failure_threshold=1, recovery_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+
+    assert breaker.allow()
+    assert not breaker.allow()
+    assert breaker.is_open()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_a_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker("ollama", failure_threshold=3, recovery_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+    assert breaker.stats()["times_opened"] == 2
+
+
+def test_ignored_errors_give_back_the_probe():
+    breaker = CircuitBreaker("ollama", failure_threshold=1, recovery_timeout=0.05, ignore=(GenerationCancelled,))
+    trip(breaker)
+    time.sleep(0.06)
+
+    def cancelled():
+        raise GenerationCancelled("client disconnected")
+
+    with pytest.raises(GenerationCancelled):
+        breaker.call(cancelled)
+    assert breaker.state == HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded, deadline_from_headers, parse_grpc_timeout
+
+HEADERS = ("X-Request-Deadline", "Grpc-Timeout")
+
+
+@pytest.mark.parametrize("value, seconds", [("2S", 2.0), ("1500m", 1.5), ("1M", 60.0), ("250u", 0.00025)])
+def test_parse_grpc_timeout(value, seconds):
+    assert parse_grpc_timeout(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", ["", "S", "10", "1.5S", "-1S", "10x"])
+def test_parse_grpc_timeout_rejects_malformed_values(value):
+    assert parse_grpc_timeout(value) is None
+
+
+def test_absolute_deadline_header():
+    deadline = deadline_from_headers({"X-Request-Deadline": str(time.time() + 10)}, *HEADERS)
+    assert 9 < deadline.remaining() <= 10
+
+
+def test_absolute_header_wins_over_grpc_timeout():
+    headers = {"X-Request-Deadline": str(time.time() + 10), "Grpc-Timeout": "1S"}
+    assert deadline_from_headers(headers, *HEADERS).remaining() > 9
+
+
+def test_no_headers_means_no_deadline():
+    assert deadline_from_headers({}, *HEADERS) is None
+
+
+def test_far_future_budget_is_capped():
+    deadline = deadline_from_headers({"Grpc-Timeout": "99999999H"}, *HEADERS, max_seconds=120)
+    assert deadline.remaining() <= 120
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-inf", "1e400"])
+def test_non_finite_deadlines_are_ignored(value):
+    assert deadline_from_headers({"X-Request-Deadline": value}, *HEADERS, max_seconds=120) is None
+
+
+def test_timeout_is_capped_at_the_time_left():
+    connect, read = Deadline.after(1.0).timeout(3, 120)
+    assert connect <= 1.0 and read <= 1.0
+
+
+def test_expired_deadline_raises():
+    deadline = Deadline.after(-1)
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout(3, 120)
@@ -0,0 +1,54 @@
+import threading
+
+from drain import DRAIN_REASON, Drainer
+from ollama_client import CancelToken
+
+
+def test_requests_that_finish_in_time_are_not_cancelled():
+    drainer = Drainer(deadline=1.0, grace=1.0)
+    finished = threading.Event()
+    drainer.on_finish(finished.set)
+    token = CancelToken()
+
+    with drainer.track(token):
+        assert drainer.begin("SIGTERM")
+        assert not drainer.begin("SIGTERM")
+    assert finished.wait(1)
+
+    assert not token.cancelled
+    stats = drainer.stats()
+    assert stats["drained_normally"] == 1
+    assert not stats["cut_over"]
+
+
+def test_cut_over_cancels_what_is_still_in_flight():
+    drainer = Drainer(deadline=0.05, grace=1.0)
+    cut_over, finished = threading.Event(), threading.Event()
+    drainer.on_cutover(cut_over.set)
+    drainer.on_finish(finished.set)
+    token = CancelToken()
+
+    with drainer.track(token):
+        drainer.begin()
+        assert cut_over.wait(1)
+        assert token.reason == DRAIN_REASON
+    assert finished.wait(1)
+    assert drainer.stats()["cut_over_requests"] == 1
+
+
+def test_finish_callbacks_run_once():
+    drainer = Drainer()
+    calls = []
+    drainer.on_finish(lambda: calls.append(1))
+    drainer.finish()
+    drainer.finish()
+    assert calls == [1]
+
+
+def test_a_failing_step_does_not_stop_the_others():
+    drainer = Drainer()
+    calls = []
+    drainer.on_finish(lambda: 1 / 0)
+    drainer.on_finish(lambda: calls.append(1))
+    drainer.finish()
+    assert calls == [1]
@@ -0,0 +1,105 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hedging import HedgeBudget, LatencyTracker, run_hedged
+from ollama_client import CancelToken
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def slow_primary(release, tokens):
+    """Primary blocks until cancelled or released; the hedge answers at once"""
+    def attempt(index, token):
+        tokens[index] = token
+        if index == 1:
+            return "hedge"
+        while not release.wait(0.01):
+            if token.cancelled:
+                return "cancelled"
+        return "primary"
+    return attempt
+
+
+def test_hedge_wins_and_the_primary_is_cancelled(executor):
+    release, tokens = threading.Event(), {}
+    budget = HedgeBudget(ratio=0.0, burst=1)
+
+    assert run_hedged(slow_primary(release, tokens), 0.02, budget, executor) == ("hedge", True)
+    assert tokens[0].cancelled
+    assert tokens[0].reason == "lost hedge race"
+    assert budget.stats()["hedge_wins"] == 1
+    release.set()
+
+
+def test_budget_caps_hedges(executor):
+    budget = HedgeBudget(ratio=0.0, burst=1)
+    for _ in range(3):
+        release, tokens = threading.Event(), {}
+        threading.Timer(0.1, release.set).start()
+        run_hedged(slow_primary(release, tokens), 0.02, budget, executor)
+
+    stats = budget.stats()
+    assert stats["hedges"] == 1
+    assert stats["denied"] == 2
+
+
+def test_budget_refills_with_requests():
+    budget = HedgeBudget(ratio=0.5, burst=1)
+    assert budget.try_spend()
+    budget.on_request()
+    assert not budget.try_spend()
+    budget.on_request()
+    assert budget.try_spend()
+
+
+def test_fast_primary_is_not_hedged(executor):
+    budget = HedgeBudget(ratio=0.0, burst=5)
+    assert run_hedged(lambda index, token: "primary", 1.0, budget, executor) == ("primary", False)
+    assert budget.stats()["hedges"] == 0
+
+
+def test_rejected_answer_loses_the_race(executor):
+    release, tokens = threading.Event(), {}
+
+    def attempt(index, token):
+        if index == 0:
+            release.wait(1)
+            return "primary"
+        return "garbage"
+
+    threading.Timer(0.1, release.set).start()
+    result = run_hedged(attempt, 0.02, HedgeBudget(burst=1), executor, accept=lambda value: value != "garbage")
+    assert result == ("primary", False)
+
+
+def test_caller_cancel_reaches_both_attempts(executor):
+    release, tokens = threading.Event(), {}
+    cancel = CancelToken()
+
+    def attempt(index, token):
+        tokens[index] = token
+        if index == 1:
+            cancel.cancel("client disconnected")
+        while not token.cancelled:
+            release.wait(0.01)
+        raise RuntimeError(token.reason)
+
+    with pytest.raises(RuntimeError, match="client disconnected"):
+        run_hedged(attempt, 0.02, HedgeBudget(burst=1), executor, cancel=cancel)
+    assert tokens[0].cancelled and tokens[1].cancelled
+
+
+def test_latency_tracker_needs_min_samples():
+    tracker = LatencyTracker(min_samples=10)
+    for seconds in range(9):
+        tracker.observe(seconds)
+    assert tracker.percentile(95) is None
+    tracker.observe(9)
+    assert tracker.percentile(50) in (4, 5)
+    assert tracker.percentile(100) == 9
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("flask")
+
+# Read at import: keep the server off disk and the network
+os.environ.update(
+    DISK_CACHE_PATH="",
+    RESIDENCY_ENABLED="false",
+    OLLAMA_HOSTS="http://127.0.0.1:9",
+    BULKHEAD_LLM_SIZE="2",
+    BULKHEAD_OPS_SIZE="1",
+    BULKHEAD_OPS_WAIT_SECONDS="0",
+)
+
+import ml_server
+from circuit_breaker import CircuitBreaker
+from drain import Drainer
+from ollama_client import GenerationCancelled
+
+ANXIOUS = {"questions": ["I worry a lot", "I feel restless"], "answers": ["yes", "yes"]}
+VERDICT = {"condition": "Anxiety", "confidence": 0.8, "severity": "Mild"}
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Replaces the Ollama call; tests append responses or exceptions, every call is recorded"""
+    calls, replies = [], []
+
+    def request_generation(payload, json_start="{", cancel=None, backend=None, exclude=(), deadline=None):
+        calls.append({"payload": payload, "cancel": cancel, "deadline": deadline})
+        reply = replies.pop(0) if replies else VERDICT
+        if isinstance(reply, BaseException):
+            raise reply
+        if callable(reply):
+            reply = reply(cancel)
+        return {"response": json.dumps(reply)}
+
+    monkeypatch.setattr(ml_server, "request_generation", request_generation)
+    return calls, replies
+
+
+@pytest.fixture
+def client(monkeypatch, generations):
+    monkeypatch.setattr(ml_server, "_background_started", True)
+    monkeypatch.setattr(ml_server, "current_model_digest", lambda: None)
+    monkeypatch.setattr(ml_server, "breaker", CircuitBreaker("ollama", ignore=ml_server.breaker.ignore))
+    ml_server.result_cache.clear()
+    return ml_server.app.test_client()
+
+
+def test_predict_uses_the_llm_then_the_cache(client, generations):
+    calls, _ = generations
+    first = client.post("/predict", json=ANXIOUS)
+    assert first.status_code == 200
+    assert first.get_json()["method"] == "ollama-ai"
+    assert first.get_json()["labels"] == ["Anxiety"]
+
+    second = client.post("/predict", json=ANXIOUS)
+    assert second.get_json()["method"] == "ollama-ai-cached"
+    assert len(calls) == 1
+
+
+def test_predict_falls_back_to_keywords_when_ollama_fails(client, generations):
+    _, replies = generations
+    replies.append(ConnectionError("connection refused"))
+    response = client.post("/predict", json=ANXIOUS)
+    assert response.status_code == 200
+    assert response.get_json()["method"] == "keyword-fallback"
+
+
+def test_no_symptoms_skips_the_llm(client, generations):
+    calls, _ = generations
+    response = client.post("/predict", json=dict(ANXIOUS, noSymptoms=True))
+    assert response.get_json()["method"] == "direct"
+    assert calls == []
+
+
+def test_full_llm_bulkhead_serves_keywords_and_liveness_still_answers(client):
+    bulkhead = ml_server.llm_bulkhead
+    for _ in range(bulkhead.max_concurrent):
+        bulkhead.enter()
+    try:
+        response = client.post("/predict", json=ANXIOUS)
+        assert response.get_json()["method"] == "keyword-bulkhead"
+        assert client.get("/health/live").status_code == 200
+    finally:
+        for _ in range(bulkhead.max_concurrent):
+            bulkhead.leave()
+
+
+def test_full_ops_bulkhead_rejects_health_but_not_liveness(client):
+    with ml_server.ops_bulkhead.guard():
+        assert client.get("/health").status_code == 503
+        assert client.get("/health/live").status_code == 200
+
+
+def test_expired_deadline_is_refused(client, generations):
+    calls, _ = generations
+    response = client.post("/predict", json=ANXIOUS, headers={"X-Request-Deadline": str(time.time() - 1)})
+    assert response.status_code == 504
+    assert calls == []
+
+
+def test_too_little_time_left_goes_straight_to_keywords(client, generations):
+    calls, _ = generations
+    response = client.post("/predict", json=ANXIOUS, headers={"Grpc-Timeout": "500m"})
+    assert response.get_json()["method"] == "keyword-deadline"
+    assert calls == []
+
+
+def test_deadline_reaches_ollama_less_the_response_margin(client, generations):
+    calls, _ = generations
+    response = client.post("/predict", json=ANXIOUS, headers={"Grpc-Timeout": "30S"})
+    assert response.get_json()["method"] == "ollama-ai"
+    assert 29 < calls[0]["deadline"].remaining() <= 30 - ml_server.DEADLINE_RESPONSE_MARGIN_SECONDS
+
+
+def test_far_future_deadline_is_capped(client, generations):
+    calls, _ = generations
+    response = client.post("/predict", json=ANXIOUS, headers={"Grpc-Timeout": "99999999H"})
+    assert response.get_json()["method"] == "ollama-ai"
+    assert calls[0]["deadline"].remaining() <= ml_server.DEADLINE_MAX_SECONDS
+
+
+@pytest.fixture
+def drainer(monkeypatch):
+    drainer = Drainer(deadline=0.1, grace=2.0)
+    drainer.on_cutover(ml_server.shed_admission_queue)
+    monkeypatch.setattr(ml_server, "drainer", drainer)
+    return drainer
+
+
+def test_requests_accepted_while_draining_get_keywords(client, generations, drainer):
+    calls, _ = generations
+    drainer.begin()
+    response = client.post("/predict", json=ANXIOUS)
+    assert response.get_json()["method"] == "keyword-drain"
+    assert calls == []
+
+
+def test_drain_cut_over_answers_keyword_drain(client, generations, drainer):
+    _, replies = generations
+    generating = threading.Event()
+
+    def hang_until_cancelled(cancel):
+        generating.set()
+        while not cancel.cancelled:
+            time.sleep(0.01)
+        raise GenerationCancelled(cancel.reason)
+
+    replies.append(hang_until_cancelled)
+    outcome = {}
+    request = threading.Thread(target=lambda: outcome.update(response=client.post("/predict", json=ANXIOUS)))
+    request.start()
+    assert generating.wait(2)
+
+    start = time.monotonic()
+    drainer.begin()
+    request.join(2)
+    assert time.monotonic() - start < 1.0
+    assert outcome["response"].get_json()["method"] == "keyword-drain"
+    assert drainer.stats()["cut_over_requests"] == 1
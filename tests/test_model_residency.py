@@ -0,0 +1,25 @@
+from model_residency import ModelResidency
+
+
+def test_slow_first_token_is_not_a_cold_load():
+    manager = ModelResidency(client=None, model="tinyllama")
+    manager.record_generation({"response": "{}", "first_token_seconds": 12.0})
+    assert manager.cold_loads == 0
+    assert manager.loaded
+    assert manager.last_first_token == 12.0
+
+
+def test_load_duration_counts_cold_loads():
+    manager = ModelResidency(client=None, model="tinyllama")
+    manager.record_generation({"load_duration": 5_000_000, "first_token_seconds": 0.2})
+    manager.record_generation({"load_duration": 8_000_000_000, "first_token_seconds": 9.0})
+    assert manager.cold_loads == 1
+    assert manager.last_load_duration == 8.0
+
+
+def test_requests_dispatched_while_unloaded_are_counted():
+    manager = ModelResidency(client=None, model="tinyllama")
+    assert not manager.note_request()
+    manager.loaded = False
+    assert manager.note_request()
+    assert manager.cold_requests == 1
@@ -0,0 +1,101 @@
+import time
+
+from ollama_client import BackendPool, CancelToken, JsonObjectDetector
+
+
+class TestJsonObjectDetector:
+    def test_object_split_across_chunks(self):
+        detector = JsonObjectDetector()
+        assert detector.feed('{"condition": "Anx') is None
+        assert detector.feed('iety", "confidence": 0.8') is None
+        assert detector.feed("}") == '{"condition": "Anxiety", "confidence": 0.8}'
+
+    def test_text_before_the_object_is_skipped(self):
+        detector = JsonObjectDetector()
+        assert detector.feed('Sure! ```json\n{"a": 1}\n```') == '{"a": 1}'
+
+    def test_brackets_inside_strings_are_ignored(self):
+        detector = JsonObjectDetector()
+        assert detector.feed('{"reason": "a } and { and \\" }"') is None
+        assert detector.feed("}") == '{"reason": "a } and { and \\" }"}'
+
+    def test_nested_objects(self):
+        detector = JsonObjectDetector()
+        assert detector.feed('{"a": {"b": [1, {"c": 2}]}} trailing') == '{"a": {"b": [1, {"c": 2}]}}'
+
+    def test_array_start(self):
+        detector = JsonObjectDetector(start="[")
+        assert detector.feed('Here: [{"a": 1},') is None
+        assert detector.feed(' {"b": 2}]') == '[{"a": 1}, {"b": 2}]'
+
+    def test_result_is_kept_after_completion(self):
+        detector = JsonObjectDetector()
+        detector.feed("{}")
+        assert detector.feed('{"more": true}') == "{}"
+
+
+class ClosableResponse:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestCancelToken:
+    def test_cancel_closes_attached_responses_and_children(self):
+        token, child = CancelToken(), CancelToken()
+        response, child_response = ClosableResponse(), ClosableResponse()
+        token.link(child)
+        token.attach(response)
+        child.attach(child_response)
+
+        assert token.cancel("client disconnected") == 2
+        assert response.closed and child_response.closed
+        assert child.reason == "client disconnected"
+        assert token.cancel() == 0
+
+    def test_attach_after_cancel_closes_at_once(self):
+        token = CancelToken()
+        token.cancel()
+        response = ClosableResponse()
+        token.attach(response)
+        assert response.closed
+
+
+class FakeClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+
+class TestBackendPool:
+    def test_failures_eject_and_a_passing_probe_does_not_readmit(self):
+        pool = BackendPool([FakeClient("a"), FakeClient("b")], eject_after=3, eject_seconds=30.0)
+        a, b = pool.backends
+        for _ in range(3):
+            pool.record_failure(a, "timed out")
+
+        pool.record_probe(a, True)
+
+        stats = pool.stats()[0]
+        assert not stats["available"]
+        assert stats["ejected_for_seconds"] > 0
+        assert stats["consecutive_errors"] == 0
+        assert all(pool.pick() is b for _ in range(4))
+
+    def test_ejected_backend_rejoins_after_eject_seconds(self):
+        pool = BackendPool([FakeClient("a"), FakeClient("b")], eject_after=1, eject_seconds=0.05)
+        a, _ = pool.backends
+        pool.record_failure(a, "timed out")
+        pool.record_probe(a, True)
+        assert not a.available(time.monotonic())
+        time.sleep(0.06)
+        assert a.available(time.monotonic())
+
+    def test_successful_request_readmits_at_once(self):
+        pool = BackendPool([FakeClient("a")], eject_after=1)
+        a = pool.backends[0]
+        pool.record_failure(a, "timed out")
+        with pool.lease() as backend:
+            assert backend is a
+        assert pool.stats()[0]["available"]
@@ -0,0 +1,43 @@
+from result_cache import DiskResultCache, ResultCache, symptom_cache_key
+
+VERDICT = ("Anxiety", 0.8, "Mild", "reasoning", "recommendation")
+
+
+def test_cache_key_ignores_order_case_and_whitespace():
+    a = symptom_cache_key(["I feel  anxious", "Poor sleep"], "tinyllama", "v1")
+    b = symptom_cache_key(["poor sleep", "i feel anxious"], "tinyllama", "v1")
+    assert a == b
+    assert a != symptom_cache_key(["poor sleep"], "tinyllama", "v1")
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", VERDICT)
+    cache.put("b", VERDICT)
+    cache.get("a")
+    cache.put("c", VERDICT)
+    assert cache.get("b") is None
+    assert cache.get("a") == VERDICT
+    assert cache.clear() == 2
+
+
+def test_disk_cache_clear_removes_committed_and_queued_rows(tmp_path):
+    cache = DiskResultCache(str(tmp_path / "cache.db"))
+    cache.put("a", "digest", VERDICT)
+    assert cache.flush()
+    cache.put("b", "digest", VERDICT)
+
+    assert cache.get("a") == VERDICT
+    assert cache.clear() == 2
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+
+
+def test_disk_cache_prune_keeps_the_current_digest(tmp_path):
+    cache = DiskResultCache(str(tmp_path / "cache.db"))
+    cache.put("old", "digest-1", VERDICT)
+    cache.put("new", "digest-2", VERDICT)
+    cache.prune("digest-2")
+    assert cache.flush()
+    assert cache.get("old") is None
+    assert cache.get("new") == VERDICT
@@ -0,0 +1,208 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from ollama_client import CancelToken, GenerationCancelled
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def run_in_thread(fn, *args):
+    outcome = {}
+
+    def target():
+        try:
+            outcome["result"] = fn(*args)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, outcome
+
+
+def slow_call(release, seen=None):
+    def fn(cancel, deadline):
+        if seen is not None:
+            seen.update(cancel=cancel, deadline=deadline)
+        while not release.wait(0.01):
+            cancel.check()
+        return "verdict"
+    return fn
+
+
+class ClosableResponse:
+    def close(self):
+        pass
+
+
+def wait_for_callers(flight, count):
+    for _ in range(200):
+        if flight.stats()["waiting"] >= count:
+            return
+        time.sleep(0.01)
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    fn = slow_call(release)
+    first, first_outcome = run_in_thread(flight.do, "key", fn)
+    second, second_outcome = run_in_thread(flight.do, "key", fn)
+    wait_for_callers(flight, 1)
+    release.set()
+    first.join()
+    second.join()
+
+    assert sorted([first_outcome["result"], second_outcome["result"]]) == [("verdict", False), ("verdict", True)]
+    assert flight.stats()["executions"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_error_reaches_every_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn(cancel, deadline):
+        release.wait()
+        raise ValueError("bad verdict")
+
+    first, first_outcome = run_in_thread(flight.do, "key", fn)
+    second, second_outcome = run_in_thread(flight.do, "key", fn)
+    wait_for_callers(flight, 1)
+    release.set()
+    first.join()
+    second.join()
+
+    assert isinstance(first_outcome["error"], ValueError)
+    assert first_outcome["error"] is second_outcome["error"]
+
+
+def test_a_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+    release = threading.Event()
+    leader_token = CancelToken()
+    first, first_outcome = run_in_thread(flight.do, "key", slow_call(release), leader_token)
+    second, second_outcome = run_in_thread(flight.do, "key", slow_call(release), CancelToken())
+    wait_for_callers(flight, 1)
+
+    leader_token.cancel("client disconnected")
+    first.join()
+    assert isinstance(first_outcome["error"], GenerationCancelled)
+
+    release.set()
+    second.join()
+    assert second_outcome["result"] == ("verdict", True)
+
+
+def test_the_last_caller_to_leave_cancels_the_call():
+    flight = SingleFlight()
+    seen = {}
+    tokens = [CancelToken(), CancelToken()]
+    threads = [run_in_thread(flight.do, "key", slow_call(threading.Event(), seen), token)[0] for token in tokens]
+    wait_for_callers(flight, 1)
+
+    tokens[0].cancel("client disconnected")
+    threads[0].join()
+    assert not seen["cancel"].cancelled
+
+    tokens[1].cancel("client disconnected")
+    threads[1].join()
+    assert seen["cancel"].cancelled
+    assert flight.stats()["abandoned"] == 1
+
+
+def test_a_short_deadline_does_not_fail_the_others():
+    flight = SingleFlight()
+    release = threading.Event()
+    seen = {}
+    first, first_outcome = run_in_thread(flight.do, "key", slow_call(release, seen), None, Deadline.after(0.05))
+    second, second_outcome = run_in_thread(flight.do, "key", slow_call(release), None, Deadline.after(30))
+    first.join()
+    assert isinstance(first_outcome["error"], DeadlineExceeded)
+
+    assert seen["deadline"].remaining() > 20
+    release.set()
+    second.join()
+    assert second_outcome["result"] == ("verdict", True)
+
+
+def test_a_caller_without_deadline_lifts_the_shared_one():
+    flight = SingleFlight()
+    release = threading.Event()
+    seen = {}
+    first, _ = run_in_thread(flight.do, "key", slow_call(release, seen), None, Deadline.after(30))
+    second, _ = run_in_thread(flight.do, "key", slow_call(release))
+    wait_for_callers(flight, 1)
+    assert seen["deadline"].remaining() == float("inf")
+    release.set()
+    first.join()
+    second.join()
+
+
+def test_cancelled_before_waiting_raises_at_once():
+    flight = SingleFlight()
+    token = CancelToken()
+    token.cancel("server draining")
+    with pytest.raises(GenerationCancelled, match="server draining"):
+        flight.do("key", slow_call(threading.Event()), token)
+
+
+def test_cancelling_the_last_caller_reports_the_aborted_stream():
+    flight = SingleFlight()
+    seen = {}
+    release = threading.Event()
+    streaming = threading.Event()
+
+    def fn(cancel, deadline):
+        seen["cancel"] = cancel
+        cancel.attach(ClosableResponse())
+        streaming.set()
+        release.wait()
+        return "verdict"
+
+    tokens = [CancelToken(), CancelToken()]
+    threads = [run_in_thread(flight.do, "key", fn, token)[0] for token in tokens]
+    wait_for_callers(flight, 1)
+    streaming.wait(2)
+    time.sleep(0.05)  # let both callers link their tokens
+
+    assert tokens[0].cancel("client disconnected") == 0
+    assert tokens[1].cancel("client disconnected") == 1
+    assert seen["cancel"].reason == "client disconnected"
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert flight.stats()["abandoned"] == 1
+
+
+def test_async_caller_after_an_abandoned_call_starts_a_fresh_one():
+    flight = AsyncSingleFlight()
+
+    async def fn(deadline):
+        await asyncio.sleep(0.3)
+        return "verdict"
+
+    async def scenario():
+        with pytest.raises(DeadlineExceeded):
+            await flight.do("key", fn, Deadline.after(0.05))
+        return await flight.do("key", fn, Deadline.after(5))
+
+    assert asyncio.run(scenario()) == ("verdict", False)
+    assert flight.stats()["executions"] == 2
+
+
+def test_async_callers_share_one_execution():
+    flight = AsyncSingleFlight()
+
+    async def fn(deadline):
+        await asyncio.sleep(0.05)
+        return "verdict"
+
+    async def scenario():
+        return await asyncio.gather(flight.do("key", fn), flight.do("key", fn))
+
+    assert sorted(asyncio.run(scenario())) == [("verdict", False), ("verdict", True)]
+    assert flight.stats()["executions"] == 1